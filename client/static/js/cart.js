@@ -22,11 +22,18 @@ function getToken() {
   return localStorage.getItem("authToken");
 }
 
+// Signed-out visitors have a server-side guest cart named by this token (merged on login)
+function rememberGuestCart(data) {
+  if (data && data.cart_token) localStorage.setItem("guestCartToken", data.cart_token);
+}
+
 async function authFetch(url, options = {}) {
   const headers = options.headers || {};
   const token = getToken();
   if (token) {
     headers["Authorization"] = `Bearer ${token}`;
+  } else if (localStorage.getItem("guestCartToken")) {
+    headers["X-Cart-Token"] = localStorage.getItem("guestCartToken");
   }
   return fetch(url, { ...options, headers });
 }
@@ -41,11 +48,10 @@ async function updateBadge() {
   const el = document.getElementById("cartCount");
   if (!el) return;
   try {
-    const response = await authFetch(`${BASE_URL}/api/cart/`);
+    const response = await authFetch(`${BASE_URL}/api/cart/summary/`);
     if (response.ok) {
-      const cartItems = await response.json();
-      const count = cartItems.reduce((sum, item) => sum + item.quantity, 0);
-      el.textContent = count;
+      const summary = await response.json();
+      el.textContent = summary.item_count;
     } else {
       el.textContent = "0";
     }
@@ -69,7 +75,7 @@ function render() {
       const qty = item.quantity;
       const imageUrl = p.image ? `${BASE_URL}${p.image}` : "";
       return `
-        <li class="cart-item" data-id="${item.id}">
+        <li class="cart-item" data-product-id="${p.id}">
           <div class="item-img">
             <img src="${imageUrl}" alt="${p.name}">
           </div>
@@ -107,7 +113,9 @@ function render() {
     }
   }
 
-  updateBadge();
+  // Count from what we already have rather than refetching the cart
+  const badge = document.getElementById("cartCount");
+  if (badge) badge.textContent = currentCart.reduce((sum, item) => sum + item.quantity, 0);
 }
 
 // API calls
@@ -122,39 +130,56 @@ async function fetchCart() {
   }
 }
 
-async function updateCartItem(itemId, quantity) {
-  try {
-    const response = await authFetch(`${BASE_URL}/api/cart/${itemId}/`, {
-      method: "PUT",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ quantity }),
-    });
-    if (response.ok) {
-      await fetchAndRender();
-    } else {
-      const errorData = await response.json();
-      alert(`Error updating item: ${errorData.detail || response.statusText}`);
-    }
-  } catch (error) {
-    alert("An error occurred while updating the cart.");
-    console.error("Error updating cart item:", error);
+// Edits are applied locally straight away and sent as one PATCH /api/cart/ batch
+// once the user stops clicking, instead of one request per tap.
+let pendingOps = [];
+let flushTimer = null;
+const FLUSH_DELAY = 400;
+
+function queueOp(op) {
+  pendingOps.push(op);
+  applyLocally(op);
+  render();
+  clearTimeout(flushTimer);
+  flushTimer = setTimeout(flushOps, FLUSH_DELAY);
+}
+
+function applyLocally(op) {
+  const item = currentCart.find(i => i.product.id === op.product_id);
+  if (!item) return;
+  if (op.op === "remove") {
+    currentCart = currentCart.filter(i => i !== item);
+  } else {
+    item.quantity = op.quantity;
   }
 }
 
-async function removeCartItem(itemId) {
+async function flushOps() {
+  clearTimeout(flushTimer);
+  if (pendingOps.length === 0) return;
+  const operations = pendingOps;
+  pendingOps = [];
   try {
-    const response = await authFetch(`${BASE_URL}/api/cart/${itemId}/`, {
-      method: "DELETE",
+    const response = await authFetch(`${BASE_URL}/api/cart/`, {
+      method: "PATCH",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ operations }),
+      keepalive: true, // lets a flush started on pagehide finish
     });
     if (response.ok) {
-      await fetchAndRender();
+      const data = await response.json();
+      rememberGuestCart(data);
+      currentCart = data.items;
+      render();
     } else {
       const errorData = await response.json();
-      alert(`Error removing item: ${errorData.detail || response.statusText}`);
+      alert(`Error updating cart: ${errorData.error || errorData.detail || response.statusText}`);
+      await fetchAndRender();
     }
   } catch (error) {
-    alert("An error occurred while removing the item.");
-    console.error("Error removing cart item:", error);
+    alert("An error occurred while updating the cart.");
+    console.error("Error updating cart:", error);
+    await fetchAndRender();
   }
 }
 
@@ -167,12 +192,10 @@ async function fetchAndRender() {
 // Events
 if (clearBtn) {
   clearBtn.addEventListener("click", async () => {
-    if (currentCart.length > 0) {
-      for (const item of currentCart) {
-        await removeCartItem(item.id);
-      }
+    for (const item of [...currentCart]) {
+      queueOp({ op: "remove", product_id: item.product.id });
     }
-    await fetchAndRender();
+    await flushOps();
   });
 }
 
@@ -180,26 +203,29 @@ if (listEl) {
   listEl.addEventListener("click", async (e) => {
     const row = e.target.closest(".cart-item");
     if (!row) return;
-    const itemId = row.dataset.id;
-    const item = currentCart.find(i => String(i.id) === itemId);
+    const productId = row.dataset.productId;
+    const item = currentCart.find(i => String(i.product.id) === productId);
+
+    if (!item) return;
 
     if (e.target.classList.contains("inc")) {
-      await updateCartItem(itemId, item.quantity + 1);
+      queueOp({ op: "set", product_id: item.product.id, quantity: item.quantity + 1 });
       return;
     }
     if (e.target.classList.contains("dec")) {
-      await updateCartItem(itemId, Math.max(1, item.quantity - 1));
+      queueOp({ op: "set", product_id: item.product.id, quantity: Math.max(1, item.quantity - 1) });
       return;
     }
     if (e.target.classList.contains("remove-btn")) {
-      await removeCartItem(itemId);
+      queueOp({ op: "remove", product_id: item.product.id });
       return;
     }
   });
 }
 
 if (checkoutBtn) {
-  checkoutBtn.addEventListener("click", () => {
+  checkoutBtn.addEventListener("click", async () => {
+    await flushOps();
     location.href = "checkout.html";
   });
 }
@@ -217,5 +243,8 @@ if (checkoutBtn) {
   });
 })();
 
+// Don't lose edits still waiting in the queue when the user navigates away
+window.addEventListener("pagehide", flushOps);
+
 // Initial render
 document.addEventListener("DOMContentLoaded", fetchAndRender);
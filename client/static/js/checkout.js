@@ -25,7 +25,9 @@ const state = {
   cartItems: [],
   addresses: [],
   selectedAddress: null,
-  payment: "cod"
+  payment: "cod",
+  // One key per checkout attempt: a retried POST replays the first order instead of placing another
+  idempotencyKey: null
 };
 
 const CONFIG = {
@@ -65,9 +67,11 @@ async function deleteAddress(id) {
 }
 
 async function placeOrder() {
+  if (!state.idempotencyKey) state.idempotencyKey = crypto.randomUUID();
+
   const res = await fetch(`${BASE_URL}/api/checkout/`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { "Content-Type": "application/json", "Idempotency-Key": state.idempotencyKey },
     body: JSON.stringify({
       address_id: state.selectedAddress ? state.selectedAddress.id : null,
       payment_method: state.payment
@@ -75,8 +79,13 @@ async function placeOrder() {
   });
 
   if (!res.ok) {
-    const errorData = await res.json();
-    throw new Error(errorData.detail || "Failed to place order.");
+    const errorData = await res.json().catch(() => ({}));
+    // Keep the key while the outcome is unknown: the first POST may still be running (409 in_progress)
+    // or the server failed/was busy (5xx, 503 cart busy). Only a final answer (empty cart, out of stock)
+    // makes the next click a new attempt.
+    const pending = res.status >= 500 || (res.status === 409 && errorData.code === "in_progress");
+    if (!pending) state.idempotencyKey = null;
+    throw new Error(errorData.detail || errorData.error || "Failed to place order.");
   }
   return res.json();
 }
@@ -540,9 +549,12 @@ function applyPaymentUI() {
 
         try {
           const orderResponse = await placeOrder();
-          showCustomAlert("Order Placed!", `Order confirmed! Order ID: ${orderResponse.id || 'Confirmed'}`, "✓");
+          const orderId = orderResponse.order_id;
+          // The checkout response already carries the full order; hand it to the confirmation page
+          if (orderResponse.order) sessionStorage.setItem("lastOrder", JSON.stringify(orderResponse.order));
+          showCustomAlert("Order Placed!", `Order confirmed! Order ID: ${orderId || 'Confirmed'}`, "✓");
           setTimeout(() => {
-            window.location.href = '/order-confirmation.html';
+            window.location.href = orderId ? `/order-confirmation.html?orderId=${orderId}` : '/order-confirmation.html';
           }, 2000);
         } catch (err) {
           showCustomAlert("Error", err.message, "✕");
@@ -77,7 +77,7 @@ function renderOrderDetails(order) {
   DOM.orderDate.textContent = order.created_at ? formatDate(order.created_at) : new Date().toLocaleDateString();
 
   // Total Amount
-  DOM.totalAmount.textContent = `₹ ${parseFloat(order.total_amount || 0).toFixed(2)}`;
+  DOM.totalAmount.textContent = `₹ ${parseFloat(order.total_price || order.total_amount || 0).toFixed(2)}`;
 
   // Payment Method
   DOM.paymentMethod.textContent = formatPaymentMethod(order.payment_method);
@@ -107,7 +107,8 @@ function renderOrderDetails(order) {
       const quantity = item.quantity;
       const price = parseFloat(product.price || 0);
       const total = (price * quantity).toFixed(2);
-      const imageUrl = product.image ? `${BASE_URL}${product.image}` : "";
+      // The API already returns absolute image URLs
+      const imageUrl = product.image ? (product.image.startsWith("http") ? product.image : `${BASE_URL}${product.image}`) : "";
 
       return `
         <li class="item">
@@ -137,10 +138,15 @@ function renderOrderDetails(order) {
     const urlParams = new URLSearchParams(window.location.search);
     const orderId = urlParams.get('orderId');
 
-    // If order ID is in URL, fetch that specific order
-    // Otherwise, fetch the latest order
+    // Checkout stashes the order it just placed, so the usual path needs no fetch at all.
+    // Otherwise, if order ID is in URL, fetch that specific order, else the latest order
     let orderData;
-    if (orderId) {
+    // Read once: a reload (or a later visit in this tab) goes to the server like any other
+    const stashed = JSON.parse(sessionStorage.getItem("lastOrder") || "null");
+    sessionStorage.removeItem("lastOrder");
+    if (stashed && (!orderId || String(stashed.id) === orderId)) {
+      orderData = stashed;
+    } else if (orderId) {
       const res = await fetch(`${BASE_URL}/api/orders/${orderId}/`);
       if (res.ok) {
         orderData = await res.json();
@@ -6,6 +6,8 @@ const state = {
   openId: null,
   currentImageIndex: 0,
   search: "",
+  next: null, // cursor URL of the next catalog page (null when on the last page)
+  linked: null, // product opened from a #id link that isn't in the loaded pages
 };
 
 const BASE_URL = "";
@@ -17,6 +19,13 @@ function getToken() {
   return userData.token || userData.access || localStorage.getItem("accessToken") || null;
 }
 
+/* --- HELPER: Product lookup (loaded pages first, then a deep-linked product) --- */
+function findProduct(id) {
+  const p = state.products.find(x => String(x.id) === String(id));
+  if (p) return p;
+  return state.linked && String(state.linked.id) === String(id) ? state.linked : undefined;
+}
+
 /* --- HELPER: Toast Popup --- */
 function showToast(message) {
   const toast = document.createElement('div');
@@ -79,6 +88,16 @@ function animateButtonSuccess(btn) {
   }, 2000);
 }
 
+/* --- HELPER: Responsive <picture> (cards render ~160px wide) --- */
+function responsiveImageHTML(src, srcset, alt, sizes = "160px") {
+  if (!srcset) return `<img src="${src}" alt="${alt}" loading="lazy">`;
+  return `
+        <picture>
+          <source type="image/webp" srcset="${srcset.webp}" sizes="${sizes}">
+          <img src="${src}" srcset="${srcset.jpeg}" sizes="${sizes}" alt="${alt}" loading="lazy">
+        </picture>`;
+}
+
 /* --- RENDER CARD --- */
 function productCardHTML(p) {
   const pId = String(p.id);
@@ -93,7 +112,7 @@ function productCardHTML(p) {
   return `
     <article class="card" data-id="${p.id}" tabindex="0" aria-label="${p.name}">
       <div class="img-wrap">
-        <img src="${imageUrl}" alt="${p.name}" loading="lazy">
+        ${responsiveImageHTML(imageUrl, p.image_srcset, p.name)}
       </div>
       <h3>${p.name}</h3>
       <div class="meta">
@@ -113,59 +132,46 @@ function productCardHTML(p) {
   `;
 }
 
+// Filtering/search now happens on the server; the grid just shows the pages loaded so far
 function renderGrid() {
-  const q = (state.search || "").toLowerCase();
-
-  const filtered = state.products.filter(p => {
-    let categoryOk = true;
-    if (state.filter === "favorite") {
-      categoryOk = state.favorites.has(String(p.id));
-    } else if (state.filter === "rajasthani") {
-      categoryOk = p.tag === "rajasthani" || (p.description && p.description.toLowerCase().includes("rajasthan"));
-    } else if (state.filter !== "all") {
-      categoryOk = p.tag === state.filter;
-    }
-
-    const nameOk = q ? p.name.toLowerCase().includes(q) : true;
-    return categoryOk && nameOk;
-  });
-
-  if (filtered.length === 0) {
+  if (state.products.length === 0) {
     grid.innerHTML = '<div style="grid-column: 1/-1; text-align:center; padding:40px;">No products found.</div>';
-  } else {
-    grid.innerHTML = filtered.map(productCardHTML).join("");
+    return;
   }
+
+  const loadMore = state.next
+    ? '<div style="grid-column: 1/-1; text-align:center;"><button class="btn js-load-more">Load more</button></div>'
+    : "";
+  grid.innerHTML = state.products.map(productCardHTML).join("") + loadMore;
 }
 
 /* --- API: ADD TO CART --- */
 async function addToCart(id) {
   const token = getToken();
-  if (!token) {
-    if (window.authModalInstance) {
-      window.authModalInstance.show();
-      window.authModalInstance.showLoginMessage('Please log in to add items to cart');
-    } else {
-      showToast("Please log in to add items to cart");
-    }
-    return;
-  }
 
-  const p = state.products.find(x => String(x.id) === String(id));
+  const p = findProduct(id);
   if (!p) return;
 
+  // Signed-out visitors get a server-side guest cart (X-Cart-Token), merged into theirs on login
+  const headers = { "Content-Type": "application/json" };
+  if (token) {
+    headers["Authorization"] = `Bearer ${token}`;
+  } else if (localStorage.getItem("guestCartToken")) {
+    headers["X-Cart-Token"] = localStorage.getItem("guestCartToken");
+  }
+
   try {
     const response = await fetch(`${BASE_URL}/api/cart/`, {
       method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-        "Authorization": `Bearer ${token}`
-      },
+      headers,
       body: JSON.stringify({ product_id: p.id, quantity: 1 }),
     });
 
     if (!response.ok) {
       throw new Error(`Failed: ${response.status}`);
     }
+    const data = await response.json();
+    if (data.cart_token) localStorage.setItem("guestCartToken", data.cart_token);
 
     showToast(`${p.name} added to cart!`);
 
@@ -199,7 +205,11 @@ function toggleFavorite(id) {
 
   localStorage.setItem("favorites", JSON.stringify([...state.favorites]));
 
-  renderGrid();
+  if (state.filter === "favorite") {
+    fetchProducts();
+  } else {
+    renderGrid();
+  }
 
   if (state.openId === id) {
     const btnFav = document.getElementById("fav");
@@ -213,7 +223,7 @@ function toggleFavorite(id) {
 
 /* --- IMAGE CAROUSEL --- */
 function updateCarousel() {
-  const p = state.products.find(x => String(x.id) === String(state.openId));
+  const p = findProduct(state.openId);
   if (!p) return;
 
   const images = p.images && p.images.length > 0 ? p.images : [p.image || "../assets/products-img/default.png"];
@@ -234,7 +244,7 @@ function updateCarousel() {
 }
 
 function nextImage() {
-  const p = state.products.find(x => String(x.id) === String(state.openId));
+  const p = findProduct(state.openId);
   if (!p) return;
 
   const images = p.images && p.images.length > 0 ? p.images : [p.image || "../assets/products-img/default.png"];
@@ -243,7 +253,7 @@ function nextImage() {
 }
 
 function prevImage() {
-  const p = state.products.find(x => String(x.id) === String(state.openId));
+  const p = findProduct(state.openId);
   if (!p) return;
 
   const images = p.images && p.images.length > 0 ? p.images : [p.image || "../assets/products-img/default.png"];
@@ -260,23 +270,31 @@ function goToImage(index) {
 const searchForm = document.getElementById('productSearchForm');
 const searchInput = document.getElementById('productSearch');
 
+let searchTimer = null;
+
 if (searchForm && searchInput) {
   searchForm.addEventListener('submit', e => {
     e.preventDefault();
+    clearTimeout(searchTimer);
     state.search = (searchInput.value || "").trim();
-    renderGrid();
+    fetchProducts();
   });
 
+  // Debounced so typing a word is one request, not one per keystroke
   searchInput.addEventListener('input', () => {
-    state.search = (searchInput.value || "").trim();
-    renderGrid();
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+      state.search = (searchInput.value || "").trim();
+      fetchProducts();
+    }, 250);
   });
 
   searchInput.addEventListener('keydown', e => {
     if (e.key === 'Escape') {
+      clearTimeout(searchTimer);
       searchInput.value = "";
       state.search = "";
-      renderGrid();
+      fetchProducts();
       searchInput.blur();
     }
   });
@@ -291,11 +309,16 @@ document.querySelector(".filter-bar").addEventListener("click", e => {
   btn.classList.add("active");
 
   state.filter = btn.dataset.filter;
-  renderGrid();
+  fetchProducts();
 });
 
 /* --- GRID INTERACTIONS --- */
 grid.addEventListener("click", e => {
+  if (e.target.classList.contains("js-load-more")) {
+    fetchProducts(state.next);
+    return;
+  }
+
   const card = e.target.closest(".card");
   if (!card) return;
   const id = card.dataset.id;
@@ -338,7 +361,7 @@ const crumbName = document.getElementById("crumbName");
 
 /* --- MODAL LOGIC --- */
 function openModal(id) {
-  const p = state.products.find(x => String(x.id) === String(id));
+  const p = findProduct(id);
   if (!p) return;
 
   state.openId = id;
@@ -432,25 +455,69 @@ if (btnFav) btnFav.addEventListener("click", () => {
 });
 
 /* --- DEEP LINKING --- */
-window.addEventListener("hashchange", () => {
-  const id = location.hash.replace("#", "");
-  if (id && state.products.some(p => String(p.id) === id)) openModal(id);
-});
-
-if (location.hash) {
+// A linked product may sit on a page that hasn't been loaded, so fetch it by id if needed
+async function openLinkedProduct() {
   const id = location.hash.replace("#", "");
-  setTimeout(() => {
-    if (state.products.some(p => String(p.id) === id)) openModal(id);
-  }, 500);
+  if (!/^\d+$/.test(id)) return;
+
+  if (!findProduct(id)) {
+    try {
+      const response = await fetch(`${BASE_URL}/api/products/${id}/`);
+      if (!response.ok) return;
+      state.linked = await response.json();
+    } catch (error) {
+      console.error("Error fetching linked product:", error);
+      return;
+    }
+  }
+  if (location.hash.replace("#", "") === id) openModal(id);
 }
 
+window.addEventListener("hashchange", openLinkedProduct);
+if (location.hash) openLinkedProduct();
+
 /* --- INITIAL DATA FETCH --- */
-async function fetchProducts() {
+// Build /api/products/ query params from the active chip and search box
+function productsQuery() {
+  const params = new URLSearchParams();
+  const terms = [];
+
+  if (state.filter === "favorite") {
+    params.set("ids", [...state.favorites].join(","));
+  } else if (state.filter === "rajasthani") {
+    terms.push("rajasthan"); // matches the tag or a mention in the description
+  } else if (state.filter !== "all") {
+    params.set("tag", state.filter);
+  }
+
+  if (state.search) terms.push(state.search);
+  if (terms.length) params.set("search", terms.join(" "));
+  return params.toString();
+}
+
+let fetchSeq = 0;
+
+// Pass the `next` cursor URL to append the following page, or nothing to reload page one
+async function fetchProducts(nextUrl = null) {
+  const seq = ++fetchSeq;
+
+  if (!nextUrl && state.filter === "favorite" && state.favorites.size === 0) {
+    state.products = [];
+    state.next = null;
+    renderGrid();
+    return;
+  }
+
   try {
-    const response = await fetch(`${BASE_URL}/api/products/`);
+    const query = productsQuery();
+    const url = nextUrl || `${BASE_URL}/api/products/${query ? `?${query}` : ""}`;
+    const response = await fetch(url);
     if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
     const data = await response.json();
-    state.products = data.results || data;
+    if (seq !== fetchSeq) return; // a newer filter/search superseded this request
+    const page = data.results || data;
+    state.products = nextUrl ? state.products.concat(page) : page;
+    state.next = data.next || null;
     renderGrid();
   } catch (error) {
     console.error("Error fetching products:", error);
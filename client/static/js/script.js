@@ -954,9 +954,13 @@ class EnhancedAuthModal {
     this.setButtonLoading(submitBtn, 'Signing In...');
 
     try {
+      // Sending the guest cart token makes the server fold that cart into the account
+      const headers = { 'Content-Type': 'application/json' };
+      const guestCartToken = localStorage.getItem('guestCartToken');
+      if (guestCartToken) headers['X-Cart-Token'] = guestCartToken;
       const response = await fetch('/api/users/login/', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers,
         body: JSON.stringify({ username: email, password }),
       });
       if (!response.ok) {
@@ -964,6 +968,7 @@ class EnhancedAuthModal {
         throw new Error(errorData.detail || 'Login failed. Invalid credentials.');
       }
       const userData = await response.json();
+      localStorage.removeItem('guestCartToken');
       this.setButtonSuccess(submitBtn, 'Welcome Back!');
       this.showSuccessMessage('Successfully signed in!');
       sessionStorage.setItem('user', JSON.stringify({ ...userData, loggedIn: true }));
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html 
-from .models import Product, UserProfile, FeaturedProduct, Order, OrderItem, Address, ProductImage
+from .models import Product, UserProfile, FeaturedProduct, Order, OrderItem, Address, ProductImage, StockReservation
 
 # --- NEW: Product Image Inline ---
 class ProductImageInline(admin.TabularInline):
@@ -98,4 +98,12 @@ class UserProfileAdmin(admin.ModelAdmin):
 class FeaturedProductAdmin(admin.ModelAdmin):
     list_display = ('product', 'is_active', 'created_at')
     list_filter = ('is_active',)
-    raw_id_fields = ('product',)
\ No newline at end of file
+    raw_id_fields = ('product',)
+
+# --- 6. Stock Reservations (pending Razorpay checkouts) ---
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'product', 'quantity', 'reference', 'expires_at')
+    list_filter = ('expires_at',)
+    search_fields = ('user__username', 'product__name', 'reference')
+    raw_id_fields = ('user', 'product')
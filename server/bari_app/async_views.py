@@ -0,0 +1,98 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from bari_project.metrics import counts_outcome
+
+from .catalog_cache import AsyncCatalogCacheMixin
+from .inventory import release_user_reservations, OutOfStockError
+from .models import UserProfile
+from .payments import get_gateway, GatewayUnavailable
+from .services import EmptyCartError
+from .views import (
+    ProductListCreateAPIView, ProductDetailAPIView, FeaturedProductListAPIView,
+    reserve_payment, gateway_unavailable_response, payment_order_payload,
+)
+
+# --- ASYNC (ASGI) VIEWS ---
+# Served instead of their sync twins when settings.ASYNC_VIEWS is on, which asgi.py does by
+# default. Creating a Razorpay order spends nearly all its time waiting on the gateway; here that
+# wait is an awaited httpx call, so one ASGI worker keeps hundreds of checkouts in flight instead
+# of one per thread. Catalog reads answer 304s and cache hits on the event loop.
+# DRF itself is sync: AsyncAPIView runs authentication, permissions and throttling, and any sync
+# handler (catalog writes, cache misses), in the request's worker thread via sync_to_async.
+# Under WSGI these still work, but each request gets a fresh event loop and so a fresh gateway
+# connection: leave ASYNC_VIEWS off there.
+
+
+class AsyncAPIView(APIView):
+    """APIView whose handlers may be coroutines. Sync handlers still work and run off the event loop."""
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Authentication may hit the database (and caches request.user for the handler)
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = await sync_to_async(self.handle_exception)(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncProductListCreateAPIView(AsyncAPIView, AsyncCatalogCacheMixin, ProductListCreateAPIView):
+    pass
+
+
+class AsyncProductDetailAPIView(AsyncAPIView, AsyncCatalogCacheMixin, ProductDetailAPIView):
+    pass
+
+
+class AsyncFeaturedProductListAPIView(AsyncAPIView, AsyncCatalogCacheMixin, FeaturedProductListAPIView):
+    pass
+
+
+class AsyncRazorpayOrderCreateAPIView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @counts_outcome('payment_create')
+    async def post(self, request):
+        user = request.user
+        try:
+            # Row locks need a transaction, which the async ORM can't do yet
+            amount, receipt = await sync_to_async(reserve_payment)(user)
+        except EmptyCartError:
+            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+        except OutOfStockError as e:
+            return Response({'error': str(e), 'out_of_stock': e.products}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            razorpay_order = await get_gateway().acreate_order(amount=amount, receipt=receipt)
+        except GatewayUnavailable as e:
+            await sync_to_async(release_user_reservations)(user)
+            return gateway_unavailable_response(e)
+        except Exception:
+            await sync_to_async(release_user_reservations)(user)
+            raise
+
+        phone = await UserProfile.objects.filter(user=user).values_list('phone', flat=True).afirst()
+        return Response(payment_order_payload(user, razorpay_order, phone=phone or ""))
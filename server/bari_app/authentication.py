@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .throttling import TokenBucket, spend, wait_time
+
+# --- STATELESS JWT READS ---
+# simplejwt's JWTAuthentication loads the User row on every request. Our access tokens also carry
+# username and is_staff, and they only live a few minutes, so for GET/HEAD/OPTIONS we build the
+# user straight from those signed claims and skip the query. Writes still load the real row.
+# Deactivating or deleting a user (signals.py) leaves a revocation marker in the cache for one
+# access-token lifetime, and claim-built reads check it, so the account's outstanding tokens stop
+# working at once. The cache has to be shared between workers for that (as for the throttles), and
+# queryset.update(is_active=False) sends no signal: call revoke_claims() yourself after one.
+
+CLAIMS = ('username', 'is_staff')
+
+
+def revocation_key(user_id):
+    return f'user-revoked:{user_id}'
+
+
+def revoke_claims(user_id):
+    """Refuse claim-built reads for this user until their current access tokens have expired."""
+    cache.set(revocation_key(user_id), True, api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+def tokens_for_user(user):
+    """A refresh token (and via .access_token, an access token) carrying the claims below."""
+    refresh = RefreshToken.for_user(user)
+    for claim in CLAIMS:
+        refresh[claim] = getattr(user, claim)
+    return refresh
+
+
+def _refuse_save(*args, **kwargs):
+    raise RuntimeError("This user was built from token claims and is read-only; load it from the database to change it")
+
+
+def user_from_claims(token):
+    user = User(
+        id=token[api_settings.USER_ID_CLAIM],
+        username=token['username'],
+        is_staff=token['is_staff'],
+        is_active=True,
+    )
+    user._state.adding = False
+    user.save = _refuse_save  # the other fields are blank; saving would wipe the real row
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts the token's claims instead of querying User on read-only requests."""
+
+    def authenticate(self, request):
+        if request.method not in SAFE_METHODS:
+            return super().authenticate(request)
+
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if cache.get(revocation_key(validated_token[api_settings.USER_ID_CLAIM])):
+            raise exceptions.AuthenticationFailed('User is inactive', code='user_inactive')
+        if not all(claim in validated_token for claim in CLAIMS):
+            # Issued before these claims existed: fall back to the database
+            return self.get_user(validated_token), validated_token
+        return user_from_claims(validated_token), validated_token
+
+
+# --- CREDENTIAL CHECKS ---
+# Checking a password costs a full PBKDF2 hash (~100ms of CPU), and so does a wrong one.
+# That is why the API doesn't accept Basic auth (a hash per request); the login view trades the
+# password for JWTs once, through verify_credentials(). It answers 429 without hashing while the
+# client's per-IP bucket, or its bucket for that username, is empty (settings.CREDENTIAL_THROTTLE_RATES).
+# Only failed checks take tokens, so signing in with the right password is never slowed down. The username
+# bucket is per (username, IP): guessing at someone's account from one address can't lock them out.
+# The IP is REMOTE_ADDR, or the address NUM_PROXIES hops back in X-Forwarded-For behind a proxy;
+# a client-supplied X-Forwarded-For is never trusted on its own.
+
+def verify_credentials(request, username, password):
+    """The user for these credentials, or None. Raises Throttled (429) once the buckets run dry."""
+    rates = settings.CREDENTIAL_THROTTLE_RATES
+    ip = BaseThrottle().get_ident(request)
+    buckets = (
+        (TokenBucket('login-ip', rates['ip']), ip),
+        (TokenBucket('login-user', rates['username']), ((username or '').strip().lower(), ip)),
+    )
+    wait = wait_time(*buckets)
+    if wait:
+        raise exceptions.Throttled(wait=wait, detail="Too many sign-in attempts, please try again later.")
+    user = authenticate(request=getattr(request, '_request', request), username=username, password=password)
+    if user is None:
+        spend(*buckets)
+    return user
+
+
+class ProfileModelBackend(ModelBackend):
+    """ModelBackend that loads the user's UserProfile in the same query, for the login response."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.select_related('userprofile').get(**{User.USERNAME_FIELD: username})
+        except User.DoesNotExist:
+            # Hash anyway so a missing account takes as long as a wrong password (as ModelBackend does)
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
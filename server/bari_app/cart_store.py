@@ -0,0 +1,341 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+from django.dispatch import receiver
+from rest_framework import exceptions, status
+
+from .models import CartItem, Product
+from .serializers import CartItemSerializer, ProductSerializer
+from .catalog_cache import get_catalog_version, catalog_reads
+from .services import (
+    add_to_cart, apply_cart_operations, fold_cart_operations, check_products_exist, upsert_cart_quantities,
+    UnknownProductError,
+)
+
+logger = logging.getLogger(__name__)
+
+# --- CART STORES ---
+# CartAPIView reads and writes carts through the store picked by settings.CART_STORE:
+#   'db'    - CartItem rows, every request.
+#   'cache' - each user's cart is a {product_id: qty} dict in the cache, and product payloads come
+#             from serialized products cached per catalog version, so a warm cart read touches no
+#             tables. Edits are written back to CartItem on a background thread (CART_WRITE_BEHIND)
+#             and always by persist() before code that reads CartItem directly (payment creation).
+#             Code that writes CartItem directly (checkout, /api/cart/<id>/) runs inside
+#             direct_writes(), which holds the cart lock from the write-back until the cached copy is
+#             dropped, so an add landing in between waits instead of being lost.
+#             Cache-mode lines have no CartItem id, so their "id" is None.
+
+
+def cart_queryset(user):
+    return CartItem.objects.filter(user=user).select_related('product').prefetch_related('product__images')
+
+
+class CartBusy(exceptions.APIException):
+    """Another request held the cart's lock for too long. Answered as 503 with Retry-After."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your cart is being updated, please try again.'
+    default_code = 'cart_busy'
+    wait = 1
+
+
+@contextmanager
+def cache_lock(key, wait=2.0):
+    """
+    A lock in the cache so concurrent edits of one cart from several workers don't overwrite each other.
+    Raises CartBusy if it can't be had within `wait` seconds.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    # The lock expires on its own, so a crashed holder only stalls others for a few seconds
+    while not cache.add(key, token, timeout=5):
+        if time.monotonic() > deadline:
+            logger.warning("Cart lock %s still held after %ss", key, wait)
+            raise CartBusy()
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        # Only release our own lock: if it expired meanwhile, someone else may hold it now.
+        # (get-then-delete isn't atomic, but the gap is microseconds against a 5s expiry.)
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def cached_product_payloads(product_ids):
+    """{product_id: ProductSerializer data}, cached per catalog version so edits to a product show up at once."""
+    version = get_catalog_version()
+    keys = {pid: f'cart-product:{version}:{pid}' for pid in product_ids}
+    cached = cache.get_many(keys.values())
+    products = {pid: cached[key] for pid, key in keys.items() if key in cached}
+
+    missing = [pid for pid in product_ids if pid not in products]
+    if missing:
+        with catalog_reads():
+            fresh = {
+                product.id: ProductSerializer(product).data
+                for product in Product.objects.filter(id__in=missing).prefetch_related('images')
+            }
+        cache.set_many({keys[pid]: data for pid, data in fresh.items()}, settings.CATALOG_CACHE_TIMEOUT)
+        products.update(fresh)
+    return products
+
+
+def items_from_quantities(quantities):
+    """Serialized cart lines, shaped like CartItemSerializer, for a {product_id: qty} cart."""
+    products = cached_product_payloads(list(quantities))
+    return [
+        {'id': None, 'product': products[pid], 'quantity': qty, 'added_at': None}
+        for pid, qty in quantities.items() if pid in products  # drops products deleted since
+    ]
+
+
+def quantize_money(amount):
+    return Decimal(amount).quantize(Decimal('0.01'))
+
+
+def cart_totals(items):
+    """item_count and subtotal for serialized cart items."""
+    subtotal = sum((Decimal(item['product']['price']) * item['quantity'] for item in items), Decimal('0.00'))
+    return {'item_count': sum(item['quantity'] for item in items), 'subtotal': str(quantize_money(subtotal))}
+
+
+class DatabaseCartStore:
+    def items(self, user):
+        return CartItemSerializer(cart_queryset(user), many=True).data
+
+    def summary(self, user):
+        totals = CartItem.objects.filter(user=user).aggregate(
+            item_count=Coalesce(Sum('quantity'), 0),
+            subtotal=Coalesce(Sum(F('quantity') * F('product__price')), Decimal('0.00'), output_field=DecimalField()),
+        )
+        return {'item_count': totals['item_count'], 'subtotal': str(quantize_money(totals['subtotal']))}
+
+    def add(self, user, product_id, quantity):
+        add_to_cart(user, product_id, quantity)
+
+    def apply(self, user, operations):
+        apply_cart_operations(user, operations)
+
+    def persist(self, user):
+        pass  # CartItem is already the source of truth
+
+    @contextmanager
+    def direct_writes(self, user):
+        yield
+
+
+class CacheCartStore:
+    def __init__(self, timeout, write_behind):
+        self.timeout = timeout
+        # One worker: write-backs are tiny, and a single thread keeps them in order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cart-write-behind') if write_behind else None
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+
+    def key(self, user_id):
+        return f'cart:{user_id}'
+
+    def load(self, user):
+        """{'items': {product_id: qty}, 'dirty': bool}, filled from CartItem on a cache miss."""
+        entry = cache.get(self.key(user.id))
+        if entry is None:
+            rows = CartItem.objects.filter(user=user).order_by('added_at', 'id').values_list('product_id', 'quantity')
+            entry = {'items': dict(rows), 'dirty': False}
+            cache.add(self.key(user.id), entry, self.timeout)  # add, not set: don't clobber a racing write
+        return entry
+
+    def items(self, user):
+        return items_from_quantities(self.load(user)['items'])
+
+    def summary(self, user):
+        # Prices come from the same cached product payloads as items(), so this is usually query-free
+        return cart_totals(self.items(user))
+
+    def add(self, user, product_id, quantity):
+        with self.locked(user.id):
+            quantities = dict(self.load(user)['items'])
+            if product_id not in quantities and not Product.objects.filter(id=product_id).exists():
+                raise Product.DoesNotExist()
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+            self.save(user, quantities)
+        self.schedule_persist(user)
+
+    def apply(self, user, operations):
+        with self.locked(user.id):
+            current = self.load(user)['items']
+            quantities = fold_cart_operations(current, operations)
+            check_products_exist([pid for pid, qty in quantities.items() if qty > 0 and pid not in current])
+            self.save(user, {pid: qty for pid, qty in quantities.items() if qty > 0})
+        self.schedule_persist(user)
+
+    def save(self, user, quantities):
+        cache.set(self.key(user.id), {'items': quantities, 'dirty': True}, self.timeout)
+
+    def persist(self, user):
+        """Write the cached cart back to CartItem if it has unsaved changes."""
+        with self.locked(user.id):
+            self._write_back(user)
+
+    @contextmanager
+    def direct_writes(self, user):
+        """
+        For code that changes CartItem itself: write back pending edits, keep the cart locked while
+        the block runs, then drop the cached copy so the next read reloads it from CartItem.
+        """
+        with self.locked(user.id):
+            self._write_back(user)
+            try:
+                yield
+            finally:
+                cache.delete(self.key(user.id))
+
+    def _write_back(self, user):
+        entry = cache.get(self.key(user.id))
+        if entry is None or not entry['dirty']:
+            return
+        quantities = entry['items']
+        existing = set(Product.objects.filter(id__in=list(quantities)).values_list('id', flat=True))
+        quantities = {pid: qty for pid, qty in quantities.items() if pid in existing}
+        with transaction.atomic():
+            upsert_cart_quantities(user, quantities)
+            CartItem.objects.filter(user=user).exclude(product_id__in=list(quantities)).delete()
+        cache.set(self.key(user.id), {'items': quantities, 'dirty': False}, self.timeout)
+
+    def schedule_persist(self, user):
+        if self.executor is None:
+            return
+        with self._pending_lock:
+            if user.id in self._pending:
+                return  # a write-back is already queued and will pick up this edit too
+            self._pending.add(user.id)
+        self.executor.submit(self._persist_in_background, user)
+
+    def _persist_in_background(self, user):
+        with self._pending_lock:
+            self._pending.discard(user.id)
+        try:
+            self.persist(user)
+        except CartBusy:
+            pass  # whoever holds the lock is editing the cart and will schedule its own write-back
+        except Exception:
+            logger.exception("Writing back the cached cart of user %s failed", user.id)
+        finally:
+            close_old_connections()
+
+    def locked(self, user_id):
+        return cache_lock(f'cart-lock:{user_id}')
+
+
+# --- GUEST CARTS ---
+# Signed-out visitors get a cart too: a {product_id: qty} dict in the cache under a random id.
+# The id travels as a signed token in the X-Cart-Token header (handed out by the first add), and
+# logging in with that header folds the guest cart into the user's cart (merge_guest_cart).
+
+GUEST_CART_HEADER = 'X-Cart-Token'
+_guest_signer = signing.TimestampSigner(salt='bari_app.guest_cart')
+
+
+def new_guest_token():
+    return _guest_signer.sign(uuid.uuid4().hex)
+
+
+def read_guest_token(token):
+    """The guest cart id inside a token we issued, or None if it is missing, forged or expired."""
+    if not token:
+        return None
+    try:
+        return _guest_signer.unsign(token, max_age=settings.GUEST_CART_TTL)
+    except signing.BadSignature:  # SignatureExpired is a subclass
+        return None
+
+
+class GuestCartStore:
+    """Same interface as the user cart stores, keyed by guest cart id instead of user."""
+
+    def key(self, cart_id):
+        return f'guest-cart:{cart_id}'
+
+    def load(self, cart_id):
+        return cache.get(self.key(cart_id), {}) if cart_id else {}
+
+    def items(self, cart_id):
+        return items_from_quantities(self.load(cart_id))
+
+    def summary(self, cart_id):
+        return cart_totals(self.items(cart_id))
+
+    def add(self, cart_id, product_id, quantity):
+        with cache_lock(f'guest-cart-lock:{cart_id}'):
+            quantities = self.load(cart_id)
+            if product_id not in quantities and not Product.objects.filter(id=product_id).exists():
+                raise Product.DoesNotExist()
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+            cache.set(self.key(cart_id), quantities, settings.GUEST_CART_TTL)
+
+    def apply(self, cart_id, operations):
+        with cache_lock(f'guest-cart-lock:{cart_id}'):
+            current = self.load(cart_id)
+            quantities = fold_cart_operations(current, operations)
+            check_products_exist([pid for pid, qty in quantities.items() if qty > 0 and pid not in current])
+            cache.set(self.key(cart_id), {pid: qty for pid, qty in quantities.items() if qty > 0}, settings.GUEST_CART_TTL)
+
+    def discard(self, cart_id):
+        cache.delete(self.key(cart_id))
+
+
+guest_carts = GuestCartStore()
+
+
+def merge_guest_cart(user, cart_id):
+    """
+    Add a guest cart's lines to `user`'s cart and delete the guest cart. Goes through
+    apply(), so with the db store the whole merge is one locked read plus one upsert.
+    """
+    quantities = guest_carts.load(cart_id)
+    if quantities:
+        operations = [{'op': 'add', 'product_id': pid, 'quantity': qty} for pid, qty in quantities.items()]
+        store = get_cart_store()
+        try:
+            store.apply(user, operations)
+        except UnknownProductError as e:
+            # Products deleted while they sat in the guest cart: merge the rest
+            store.apply(user, [op for op in operations if op['product_id'] not in e.product_ids])
+    guest_carts.discard(cart_id)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cart_store():
+    """The process-wide cart store for settings.CART_STORE ('db' or 'cache')."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.CART_STORE == 'cache':
+                    _store = CacheCartStore(settings.CART_CACHE_TIMEOUT, settings.CART_WRITE_BEHIND)
+                else:
+                    _store = DatabaseCartStore()
+    return _store
+
+
+@receiver(setting_changed)
+def reset_cart_store(setting=None, **kwargs):
+    global _store
+    if setting in (None, 'CART_STORE', 'CART_CACHE_TIMEOUT', 'CART_WRITE_BEHIND'):
+        _store = None
@@ -0,0 +1,112 @@
+import hashlib
+import time
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .db_router import primary_reads
+
+# --- CATALOG CACHE ---
+# Every cached catalog payload is keyed by the current catalog version. Saving or deleting a
+# Product, ProductImage or FeaturedProduct bumps the version (see signals.py), which orphans
+# all old entries at once - no need to track which pages a product appeared on.
+# Pinning only keeps the writer's own queries on the primary. Whoever misses the cache first after
+# a bump fills the new version, and a replica that hasn't caught up would put the old data under
+# the new ETag for CATALOG_CACHE_TIMEOUT. So misses read the primary for REPLICA_PIN_SECONDS
+# after each bump (catalog_reads()).
+
+VERSION_KEY = 'catalog:version'
+FRESH_KEY = 'catalog:fresh'
+
+
+def get_catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock rather than 1 so a lost/evicted version never reuses old keys
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, timeout=None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+async def aget_catalog_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        version = await sync_to_async(get_catalog_version)()
+    return version
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+    cache.set(FRESH_KEY, True, settings.REPLICA_PIN_SECONDS)
+
+
+def catalog_reads():
+    """Context for filling a catalog cache miss: the primary while the last write may not have replicated."""
+    return primary_reads() if cache.get(FRESH_KEY) else nullcontext()
+
+
+class CatalogCacheMixin:
+    """
+    Serves GET from the cache and answers If-None-Match with 304 Not Modified.
+    Mix into a generic view before the DRF base class.
+    """
+
+    def get(self, request, *args, **kwargs):
+        key, headers = self.cache_entry(request, get_catalog_version())
+        if self.not_modified(request, headers):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, headers=headers)
+        return self.get_and_cache(key, headers, request, *args, **kwargs)
+
+    def cache_entry(self, request, version):
+        # The full URI (host + query string) because payloads embed absolute image URLs and cursors
+        digest = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        etag = f'"{version}-{digest[:16]}"'
+        return f'catalog:{version}:{digest}', {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+    def not_modified(self, request, headers):
+        if_none_match = request.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        # Weak comparison (RFC 9110 13.1.2): compressed responses carry W/"..." (APICompressionMiddleware).
+        # "*" is not special-cased: it only matches if the resource exists, which we don't know yet,
+        # so those requests get the normal 200 or 404 (parse_etags() turns it into ['*'], never a match).
+        return headers['ETag'] in (etag.removeprefix('W/') for etag in parse_etags(if_none_match))
+
+    def get_and_cache(self, key, headers, request, *args, **kwargs):
+        with catalog_reads():
+            response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+            for name, value in headers.items():
+                response[name] = value
+        return response
+
+
+class AsyncCatalogCacheMixin(CatalogCacheMixin):
+    """
+    CatalogCacheMixin for AsyncAPIView: 304s and cache hits are answered on the event loop;
+    only a miss runs the (sync) queryset and serializer, in the request's worker thread.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        key, headers = self.cache_entry(request, await aget_catalog_version())
+        if self.not_modified(request, headers):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = await cache.aget(key)
+        if data is not None:
+            return Response(data, headers=headers)
+        return await sync_to_async(self.get_and_cache)(key, headers, request, *args, **kwargs)
@@ -0,0 +1,122 @@
+import contextvars
+import hashlib
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+# --- READ REPLICA ROUTING ---
+# When a 'replica' database is configured (DB_REPLICA_HOST), catalog and order-history reads go to
+# it; everything else, and every write, stays on 'default'. Replicas lag, so a client that just
+# wrote something (placed an order, edited the catalog in the admin) is pinned to the primary for
+# REPLICA_PIN_SECONDS and sees its own writes. Non-GET requests always run entirely on the primary,
+# so checkout never reads stock or orders from the replica.
+
+REPLICA = 'replica'
+
+# (app_label, model_name) of models whose reads can tolerate a little replication lag
+REPLICA_MODELS = {
+    ('bari_app', 'product'),
+    ('bari_app', 'productimage'),
+    ('bari_app', 'featuredproduct'),
+    ('bari_app', 'order'),
+    ('bari_app', 'orderitem'),
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_primary = contextvars.ContextVar('use_primary', default=False)
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def primary_reads():
+    """Route the reads inside the block to the primary, as for a pinned client."""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            replica_enabled()
+            and not _use_primary.get()
+            and (model._meta.app_label, model._meta.model_name) in REPLICA_MODELS
+        ):
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # same data on both aliases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def pin_key(request):
+    # The same client across requests: its bearer token, session, guest cart, or failing those its IP
+    ident = (
+        request.headers.get('Authorization')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        or request.headers.get('X-Cart-Token')
+        or request.META.get('REMOTE_ADDR', '')
+    )
+    return 'db-pin:' + hashlib.sha256(ident.encode()).hexdigest()[:32]
+
+
+class ReplicaPinMiddleware:
+    """Runs writes, and reads shortly after the same client's writes, against the primary."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not replica_enabled():
+            return self.get_response(request)
+
+        key = pin_key(request)
+        writing = request.method not in SAFE_METHODS
+        token = _use_primary.set(writing or bool(cache.get(key)))
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+
+        if writing:
+            cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        # The same, for async views; the context variable follows the request into sync_to_async threads
+        if not replica_enabled():
+            return await self.get_response(request)
+
+        key = pin_key(request)
+        writing = request.method not in SAFE_METHODS
+        token = _use_primary.set(writing or bool(await cache.aget(key)))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+
+        if writing:
+            await cache.aset(key, True, settings.REPLICA_PIN_SECONDS)
+        return response
@@ -0,0 +1,85 @@
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- FAKE RAZORPAY ---
+# A tiny stand-in for the Razorpay orders API so checkout can be load-tested offline.
+# Point PAYMENT_GATEWAY_BASE_URL at it (see the run_fake_gateway command) and it answers:
+#   POST /v1/orders            -> a created order, after `latency` seconds
+#   POST /v1/fake/payments     -> {razorpay_order_id, razorpay_payment_id, razorpay_signature}
+#                                 correctly signed, ready to send to /api/payment/verify/
+# `failure_rate` makes that share of order calls return a 502 to exercise retries and the breaker.
+
+
+def sign_payment(order_id, payment_id, key_secret):
+    message = f'{order_id}|{payment_id}'.encode()
+    return hmac.new(key_secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+
+        if self.path.rstrip('/') == '/v1/orders':
+            with server.lock:
+                server.order_calls += 1
+            time.sleep(server.latency)
+            if random.random() < server.failure_rate:
+                return self.reply(502, {'error': {'code': 'SERVER_ERROR', 'description': 'Injected failure'}})
+            return self.reply(200, {
+                'id': f'order_{uuid.uuid4().hex[:14]}',
+                'entity': 'order',
+                'amount': body.get('amount'),
+                'currency': body.get('currency', 'INR'),
+                'receipt': body.get('receipt'),
+                'status': 'created',
+                'created_at': int(time.time()),
+            })
+
+        if self.path.rstrip('/') == '/v1/fake/payments':
+            order_id = body.get('order_id', '')
+            payment_id = f'pay_{uuid.uuid4().hex[:14]}'
+            return self.reply(200, {
+                'razorpay_order_id': order_id,
+                'razorpay_payment_id': payment_id,
+                'razorpay_signature': sign_payment(order_id, payment_id, server.key_secret),
+            })
+
+        self.reply(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Unknown endpoint'}})
+
+    def reply(self, status_code, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (timed out) before we answered
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(key_secret, host='127.0.0.1', port=0, latency=0.0, failure_rate=0.0, verbose=False):
+    """A ThreadingHTTPServer ready to serve_forever(); port 0 picks a free port (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), FakeGatewayHandler)
+    server.daemon_threads = True
+    server.key_secret = key_secret
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.verbose = verbose
+    server.order_calls = 0
+    server.lock = threading.Lock()
+    return server
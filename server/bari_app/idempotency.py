@@ -0,0 +1,99 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+# --- IDEMPOTENCY KEYS ---
+# A client that sends `Idempotency-Key: <uuid>` gets exactly one execution per key: retries
+# within IDEMPOTENCY_KEY_TTL replay the stored first response (from the cache, falling back to
+# the IdempotencyKey table) instead of placing a second order. A key whose first request is still
+# running answers 409, but only for IDEMPOTENCY_LEASE seconds: a worker killed mid-request (e.g. a
+# gunicorn timeout) never records a result, and after the lease a retry takes the key over.
+
+HEADER = 'Idempotency-Key'
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _replay(status_code, body):
+    return Response(body, status=status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(view_method):
+    """Decorator for an authenticated APIView.post() that places orders or takes payments."""
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': f'{HEADER} must be at most 255 characters'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ttl = settings.IDEMPOTENCY_KEY_TTL
+        request_hash = _request_hash(request)
+        cache_key = 'idem:{}:{}'.format(
+            request.user.id, hashlib.sha256(f'{request.path}:{key}'.encode()).hexdigest()
+        )
+
+        # Fast path: a retry of a request that already finished
+        entry = cache.get(cache_key)
+        if entry is not None and entry['hash'] == request_hash:
+            return _replay(entry['status'], entry['body'])
+
+        # Claim the key; the unique (user, key, endpoint) row is the lock between racing retries
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=request.user, key=key, endpoint=request.path, request_hash=request_hash
+                )
+        except IntegrityError:
+            record = IdempotencyKey.objects.get(user=request.user, key=key, endpoint=request.path)
+            if record.created_at < timezone.now() - timedelta(seconds=ttl):
+                # Stale key being reused: forget the old result and run again
+                record.delete()
+                return wrapper(self, request, *args, **kwargs)
+            if record.request_hash != request_hash:
+                return Response({'error': f'{HEADER} was already used with a different request'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.status_code is None and record.created_at < timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_LEASE):
+                # Abandoned by a worker that died: the conditional delete lets exactly one retry take over
+                IdempotencyKey.objects.filter(id=record.id, status_code__isnull=True).delete()
+                return wrapper(self, request, *args, **kwargs)
+            if record.status_code is None:
+                # 'code' tells clients this 409 apart from the view's own: keep the key and retry
+                return Response({'error': 'A request with this key is still being processed', 'code': 'in_progress'},
+                                status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+            cache.set(cache_key, {'hash': request_hash, 'status': record.status_code, 'body': record.response_body}, ttl)
+            return _replay(record.status_code, record.response_body)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            # Server-side failures are not final: let the client retry with the same key
+            record.delete()
+            return response
+
+        record.status_code = response.status_code
+        record.response_body = response.data
+        record.save(update_fields=['status_code', 'response_body'])
+        cache.set(cache_key, {'hash': request_hash, 'status': response.status_code, 'body': response.data}, ttl)
+        return response
+
+    return wrapper
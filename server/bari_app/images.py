@@ -0,0 +1,123 @@
+import logging
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# --- RESPONSIVE IMAGE VARIANTS ---
+# Product cards render at ~160px wide, the product modal at ~600px. Each uploaded image gets
+# a resized copy per width and format, stored next to the original under variants/:
+#   products/gallery/kachri.jpg -> products/gallery/variants/kachri-jpg-320w.webp
+# The source extension stays in the name so ker.png and ker.jpg don't share (and skip) variants.
+VARIANT_WIDTHS = (160, 320, 640, 1280)
+VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+def variant_name(name, width, fmt):
+    directory, filename = posixpath.split(name)
+    stem, source_extension = posixpath.splitext(filename)
+    extension = 'jpg' if fmt == 'jpeg' else fmt
+    if source_extension:
+        stem = f'{stem}-{source_extension[1:].lower()}'
+    return posixpath.join(directory, 'variants', f'{stem}-{width}w.{extension}')
+
+
+def variant_names(name):
+    return [variant_name(name, width, fmt) for width in VARIANT_WIDTHS for fmt in VARIANT_FORMATS]
+
+
+def has_variants(field_file):
+    # The largest variant is written last, so its presence means the whole set was built
+    return field_file.storage.exists(variant_names(field_file.name)[-1])
+
+
+def build_variants(field_file, force=False):
+    """
+    Write every width/format variant of an ImageField file to its storage.
+    Returns the number of files written (0 if they already exist or the source is unreadable).
+    """
+    if not field_file:
+        return 0
+
+    storage = field_file.storage
+    if not force and has_variants(field_file):
+        return 0
+
+    try:
+        with storage.open(field_file.name, 'rb') as source:
+            original = Image.open(source)
+            original.load()
+    except FileNotFoundError:
+        logger.info("Skipping image variants for %s: original file is missing", field_file.name)
+        return 0
+    except (OSError, UnidentifiedImageError) as exc:
+        logger.warning("Skipping image variants for %s: %s", field_file.name, exc)
+        return 0
+
+    original = ImageOps.exif_transpose(original)
+    written = 0
+    for width in VARIANT_WIDTHS:
+        resized = original.copy()
+        # thumbnail() never upscales, so small uploads keep their size at the larger widths
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+
+        for fmt, options in VARIANT_FORMATS.items():
+            image = resized
+            if fmt == 'jpeg' and image.mode != 'RGB':
+                image = _flatten(image)
+            buffer = BytesIO()
+            image.save(buffer, **options)
+
+            name = variant_name(field_file.name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+            written += 1
+    return written
+
+
+def _flatten(image):
+    # JPEG has no alpha channel: composite transparent PNGs onto white instead of black
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def delete_variants(field_file):
+    """Remove the resized copies of an ImageField file. Returns the number of files deleted."""
+    if not field_file:
+        return 0
+    deleted = 0
+    for name in variant_names(field_file.name):
+        if field_file.storage.exists(name):
+            field_file.storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+def srcset(field_file, request=None):
+    """
+    {'webp': 'url 160w, url 320w, ...', 'jpeg': '...'} for an ImageField file, or None
+    while its variants haven't been built (the client then falls back to the original).
+    """
+    if not field_file or not has_variants(field_file):
+        return None
+
+    storage = field_file.storage
+    result = {}
+    for fmt in VARIANT_FORMATS:
+        candidates = []
+        for width in VARIANT_WIDTHS:
+            url = storage.url(variant_name(field_file.name, width, fmt))
+            if request:
+                url = request.build_absolute_uri(url)
+            candidates.append(f'{url} {width}w')
+        result[fmt] = ', '.join(candidates)
+    return result
@@ -0,0 +1,134 @@
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, When, F, IntegerField
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+logger = logging.getLogger(__name__)
+
+
+class OutOfStockError(Exception):
+    def __init__(self, products):
+        self.products = products  # [{'id', 'name', 'available'}] for the lines that can't be filled
+        super().__init__("Not enough stock for: " + ", ".join(p['name'] for p in products))
+
+
+# --- INVENTORY ---
+# Stock only moves through apply_stock_deltas(), which row-locks just the products involved,
+# always in product-id order, so two checkouts sharing products queue behind each other
+# instead of deadlocking, and checkouts for different products never wait at all.
+# Lock order everywhere is: the user's cart rows (services.place_order), reservations, then products.
+
+def apply_stock_deltas(deltas, allow_oversell=False):
+    """
+    Take `delta` units off each product's stock ({product_id: delta}; negative gives stock back).
+    Must run inside a transaction. Raises OutOfStockError without changing anything if any
+    positive delta exceeds what is on the shelf, unless allow_oversell: then stock goes negative
+    and a warning is logged so the order can be restocked or refunded.
+    """
+    deltas = {pid: delta for pid, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    products = list(
+        Product.objects.select_for_update()
+        .filter(id__in=deltas)
+        .order_by('id')
+        .only('id', 'name', 'stock')
+    )
+    short = [
+        {'id': p.id, 'name': p.name, 'available': max(p.stock, 0)}
+        for p in products if deltas[p.id] > 0 and p.stock < deltas[p.id]
+    ]
+    if short and not allow_oversell:
+        raise OutOfStockError(short)
+    if short:
+        logger.warning("Oversold for a paid order, restock or refund: %s", OutOfStockError(short))
+
+    # One UPDATE for the whole cart instead of one per line
+    Product.objects.filter(id__in=deltas).update(stock=Case(
+        *[When(id=pid, then=F('stock') - delta) for pid, delta in deltas.items()],
+        output_field=IntegerField(),
+    ))
+    # No bump_catalog_version() here (.update() skips the post_save that would do it). Bumping on every
+    # reservation, checkout, release and expiry would drop every cached catalog page and cart payload
+    # once per checkout, exactly when traffic peaks. The trade-off: stock and ?in_stock= results shown
+    # from the catalog cache can be up to CATALOG_CACHE_TIMEOUT old. That's display only; the row locks
+    # above are what stop overselling, and a sold-out line gets a 409 with the real stock at checkout.
+
+
+def cart_quantities(cart_items):
+    quantities = Counter()
+    for item in cart_items:
+        quantities[item.product_id] += item.quantity
+    return quantities
+
+
+def claim_cart_stock(user, cart_items, allow_oversell=False):
+    """
+    Take stock for an order being placed from `cart_items`. Anything the user already holds
+    in reservations counts towards it; the rest comes off the shelf and leftovers go back.
+    """
+    with transaction.atomic():
+        reservations = list(StockReservation.objects.select_for_update().filter(user=user))
+        deltas = cart_quantities(cart_items)
+        deltas.subtract(cart_quantities(reservations))
+
+        apply_stock_deltas(deltas, allow_oversell=allow_oversell)
+        if reservations:
+            StockReservation.objects.filter(id__in=[r.id for r in reservations]).delete()
+
+
+def reserve_cart_stock(user, cart_items, reference):
+    """
+    Hold stock for a payment that hasn't been verified yet. Replaces any earlier hold the user
+    had (one pending checkout per user) and expires after STOCK_RESERVATION_TTL seconds.
+    """
+    release_expired_reservations()
+
+    with transaction.atomic():
+        previous = list(StockReservation.objects.select_for_update().filter(user=user))
+        deltas = cart_quantities(cart_items)
+        deltas.subtract(cart_quantities(previous))
+
+        apply_stock_deltas(deltas)
+        if previous:
+            StockReservation.objects.filter(id__in=[r.id for r in previous]).delete()
+
+        expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+        StockReservation.objects.bulk_create([
+            StockReservation(user=user, product_id=product_id, quantity=quantity, reference=reference, expires_at=expires_at)
+            for product_id, quantity in cart_quantities(cart_items).items()
+        ])
+
+
+def release_expired_reservations():
+    """Give stock from abandoned Razorpay checkouts back to the shelf. Returns rows released."""
+    with transaction.atomic():
+        # skip_locked: a reservation being verified right now is left to that request
+        expired = list(
+            StockReservation.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lte=timezone.now())
+        )
+        _give_back(expired)
+        return len(expired)
+
+
+def release_user_reservations(user):
+    """Give back whatever `user` is holding, e.g. when creating the gateway order failed."""
+    with transaction.atomic():
+        _give_back(list(StockReservation.objects.select_for_update().filter(user=user)))
+
+
+def _give_back(reservations):
+    if not reservations:
+        return
+    returned = Counter()
+    returned.subtract(cart_quantities(reservations))
+    apply_stock_deltas(returned)
+    StockReservation.objects.filter(id__in=[r.id for r in reservations]).delete()
@@ -0,0 +1,98 @@
+import gzip
+import time
+import zlib
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from bari_app.cart_store import cart_queryset
+from bari_app.middleware import brotli
+from bari_app.models import Product, ProductImage, Order, OrderItem, CartItem
+from bari_app.renderers import FastJSONRenderer
+from bari_app.serializers import ProductSerializer, OrderSerializer, CartItemSerializer
+from bari_app.views import order_detail_queryset
+
+HOST = 'barifoods.in'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark APICompressionMiddleware's codecs on product, order and cart payloads rendered as the API "
+        "serves them (absolute image URLs included): compressed size and compression time per level. "
+        "Sample rows are created inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=24, help="One catalog page.")
+        parser.add_argument('--orders', type=int, default=20)
+        parser.add_argument('--cart', type=int, default=8, help="Lines in the sample cart.")
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stdout.write(self.style.WARNING("brotli is not installed: only gzip is benchmarked."))
+
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=[HOST]):
+            payloads = self.sample_data(options['products'], options['orders'], options['cart'])
+            transaction.set_rollback(True)
+
+        codecs = [(f'gzip -{level}', lambda body, level=level: gzip.compress(body, level, mtime=0))
+                  for level in (1, 6, 9)]
+        if brotli:
+            codecs += [(f'br q{quality}', lambda body, quality=quality: brotli.compress(body, quality=quality))
+                       for quality in (1, 5, 11)]
+
+        for label, data in payloads:
+            body = FastJSONRenderer().render(data)
+            self.stdout.write(f"{label}: {len(body) / 1024:.1f} KiB")
+            for name, compress in codecs:
+                size = len(compress(body))
+                seconds = self.time(lambda: compress(body), options['iterations'])
+                self.stdout.write(
+                    f"  {name:<8} {size / 1024:7.1f} KiB   saved {100 - size * 100 / len(body):5.1f}%   "
+                    f"{seconds * 1000:7.3f} ms   {len(body) / seconds / 2 ** 20:6.0f} MiB/s"
+                )
+
+        self.stdout.write(f"(zlib {zlib.ZLIB_RUNTIME_VERSION}{', brotli ' + brotli.version if brotli else ''})")
+
+    def sample_data(self, product_count, order_count, cart_count):
+        products = []
+        for n in range(product_count):
+            product = Product.objects.create(
+                name=f'Bench product {n}', description='Handmade, small batch. ' * 5,
+                price=Decimal('99.50') + n, stock=10, image=f'products/bench-{n}.jpg',
+            )
+            ProductImage.objects.bulk_create([
+                ProductImage(product=product, image=f'products/gallery/bench-{n}-{i}.jpg') for i in range(3)
+            ])
+            products.append(product)
+
+        user = User.objects.create_user(username='bench-compression-user')
+        for n in range(order_count):
+            order = Order.objects.create(user=user, total_price=Decimal('499.00'))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=products[(n + i) % product_count], quantity=2, price_at_purchase=Decimal('99.50'))
+                for i in range(5)
+            ])
+        CartItem.objects.bulk_create([
+            CartItem(user=user, product=products[n % product_count], quantity=1) for n in range(cart_count)
+        ])
+
+        # Serialized against a request, like the views, so image URLs are absolute
+        context = {'request': RequestFactory().get('/api/', secure=True, HTTP_HOST=HOST)}
+        return [
+            ('products', ProductSerializer(Product.objects.catalog().filter(id__in=[p.id for p in products]),
+                                           many=True, context=context).data),
+            ('orders', OrderSerializer(order_detail_queryset(user), many=True, context=context).data),
+            ('cart', CartItemSerializer(cart_queryset(user), many=True, context=context).data),
+        ]
+
+    def time(self, func, iterations):
+        func()  # warm up
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - started) / iterations
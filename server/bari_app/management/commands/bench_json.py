@@ -0,0 +1,84 @@
+import time
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from bari_app.models import Product, ProductImage, Order, OrderItem
+from bari_app.renderers import FastJSONRenderer, FastJSONParser, orjson
+from bari_app.serializers import ProductSerializer, OrderSerializer
+from bari_app.views import order_detail_queryset
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark DRF's stdlib JSON renderer/parser against bari_app.renderers on ProductSerializer "
+        "and OrderSerializer output. Sample rows are created inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=20)
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed: FastJSON* fall back to the stdlib."))
+
+        with transaction.atomic():
+            products, orders = self.sample_data(options['products'], options['orders'])
+            transaction.set_rollback(True)
+
+        for label, data in (('products', products), ('orders', orders)):
+            body = JSONRenderer().render(data)
+            self.stdout.write(f"{label}: {len(body) / 1024:.0f} KiB per payload")
+            self.compare('  render', options['iterations'],
+                         lambda: JSONRenderer().render(data),
+                         lambda: FastJSONRenderer().render(data))
+            self.compare('  parse ', options['iterations'],
+                         lambda: JSONParser().parse(BytesIO(body)),
+                         lambda: FastJSONParser().parse(BytesIO(body)))
+
+    def sample_data(self, product_count, order_count):
+        products = []
+        for n in range(product_count):
+            product = Product.objects.create(
+                name=f'Bench product {n}', description='Handmade, small batch. ' * 5,
+                price=Decimal('99.50') + n, stock=10, image=f'products/bench-{n}.jpg',
+            )
+            ProductImage.objects.bulk_create([
+                ProductImage(product=product, image=f'products/gallery/bench-{n}-{i}.jpg') for i in range(3)
+            ])
+            products.append(product)
+
+        user = User.objects.create_user(username='bench-json-user')
+        for n in range(order_count):
+            order = Order.objects.create(user=user, total_price=Decimal('499.00'))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=products[(n + i) % product_count], quantity=2, price_at_purchase=Decimal('99.50'))
+                for i in range(5)
+            ])
+
+        return (
+            ProductSerializer(Product.objects.catalog().filter(id__in=[p.id for p in products]), many=True).data,
+            OrderSerializer(order_detail_queryset(user), many=True).data,
+        )
+
+    def compare(self, label, iterations, stdlib, fast):
+        baseline = self.time(stdlib, iterations)
+        optimised = self.time(fast, iterations)
+        self.stdout.write(
+            f"{label}  stdlib {baseline * 1000:7.3f} ms   fast {optimised * 1000:7.3f} ms   "
+            f"x{baseline / optimised:.1f}"
+        )
+
+    def time(self, func, iterations):
+        func()  # warm up
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - started) / iterations
@@ -0,0 +1,54 @@
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+
+from bari_app.models import UserProfile
+from bari_app.views import UserLoginAPIView
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure queries and wall time per POST /api/users/login/, for a user with a profile and one "
+        "without. Runs against the configured database inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        view = UserLoginAPIView.as_view()
+        factory = APIRequestFactory()
+        password = uuid.uuid4().hex
+
+        # The login throttle would stop us after a handful of attempts
+        with override_settings(CREDENTIAL_THROTTLE_RATES={'ip': '1000000/s', 'username': '1000000/s'}):
+            with transaction.atomic():
+                for label, with_profile in (('with profile', True), ('without profile', False)):
+                    user = User.objects.create_user(username=f'bench-{uuid.uuid4().hex[:12]}', password=password)
+                    if with_profile:
+                        UserProfile.objects.create(user=user, phone='9999999999')
+                    self.run(view, factory, user, password, label, options['iterations'], with_profile)
+                transaction.set_rollback(True)
+
+    def run(self, view, factory, user, password, label, iterations, with_profile):
+        queries = 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            request = factory.post('/api/users/login/', {'username': user.username, 'password': password}, format='json')
+            with CaptureQueriesContext(connection) as ctx:
+                response = view(request)
+            assert response.status_code == 200, response.data
+            queries += len(ctx.captured_queries)
+            if not with_profile:
+                # A login that creates the missing profile would make the rest look like "with profile"
+                UserProfile.objects.filter(user=user).delete()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{label:16} {queries / iterations:5.2f} queries/login  "
+            f"{elapsed / iterations * 1000:7.1f} ms/login  ({iterations} logins)"
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from bari_app.images import build_variants
+from bari_app.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = "Build resized WebP/JPEG variants for product images uploaded before the variant pipeline existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild variants that already exist.")
+
+    def handle(self, *args, **options):
+        written = 0
+        for model in (Product, ProductImage):
+            for obj in model.objects.exclude(image='').exclude(image__isnull=True).iterator():
+                written += build_variants(obj.image, force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} image variants."))
@@ -0,0 +1,84 @@
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import requests
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from bari_app.authentication import tokens_for_user
+from bari_app.models import Product, CartItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test POST /api/payment/create/ on a running server. Start the fake gateway with some "
+        "latency (run_fake_gateway --latency 0.2), point the server at it with PAYMENT_GATEWAY_BASE_URL, "
+        "then run this once against `uvicorn bari_project.asgi:application` and once against "
+        "`gunicorn bari_project.wsgi` to compare. Creates one user and product per client in the "
+        "server's database and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=100, help="Clients sending requests back to back.")
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        endpoint = options['url'].rstrip('/') + '/api/payment/create/'
+        users, products = self.sample_data(concurrency)
+        remaining = iter(range(options['requests']))
+        lock = threading.Lock()
+        timings, statuses = [], Counter()
+
+        def client(user):
+            session = requests.Session()
+            session.headers['Authorization'] = f'Bearer {tokens_for_user(user).access_token}'
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                started = time.perf_counter()
+                try:
+                    status = session.post(endpoint, json={}, timeout=60).status_code
+                except requests.RequestException as e:
+                    status = type(e).__name__
+                with lock:
+                    timings.append(time.perf_counter() - started)
+                    statuses[status] += 1
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(client, users))
+            elapsed = time.perf_counter() - started
+        finally:
+            User.objects.filter(id__in=[u.id for u in users]).delete()
+            Product.objects.filter(id__in=[p.id for p in products]).delete()
+
+        timings.sort()
+        self.stdout.write(
+            f"{len(timings)} requests, {concurrency} concurrent, in {elapsed:.1f}s: {len(timings) / elapsed:.1f} req/s\n"
+            f"latency p50 {statistics.median(timings) * 1000:.0f} ms   "
+            f"p95 {timings[int(len(timings) * 0.95) - 1] * 1000:.0f} ms   max {timings[-1] * 1000:.0f} ms\n"
+            f"responses: " + ", ".join(f"{status} x{count}" for status, count in sorted(statuses.items(), key=str))
+        )
+
+    def sample_data(self, count):
+        run = uuid.uuid4().hex[:8]
+        users = User.objects.bulk_create([User(username=f'loadtest-{run}-{n}') for n in range(count)])
+        products = Product.objects.bulk_create([
+            Product(name=f'Load test {run} {n}', price=Decimal('99.00'), stock=1_000_000) for n in range(count)
+        ])
+        if not users[0].pk:  # backends that can't return ids from bulk_create (MySQL)
+            users = list(User.objects.filter(username__startswith=f'loadtest-{run}-').order_by('id'))
+            products = list(Product.objects.filter(name__startswith=f'Load test {run} ').order_by('id'))
+        CartItem.objects.bulk_create([
+            CartItem(user=user, product=product, quantity=1) for user, product in zip(users, products)
+        ])
+        return users, products
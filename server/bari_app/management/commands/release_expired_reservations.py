@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from bari_app.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Return stock held by Razorpay checkouts that were never verified. Run from cron every few minutes."
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired stock reservations."))
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bari_app.fake_gateway import make_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local fake Razorpay API for offline load tests. Start the app with "
+        "PAYMENT_GATEWAY_BASE_URL=http://127.0.0.1:<port> to use it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=9191)
+        parser.add_argument('--latency', type=float, default=0.0, help="Seconds to wait before answering order calls.")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="Share (0-1) of order calls that return 502.")
+        parser.add_argument('--verbose', action='store_true', help="Log every request.")
+
+    def handle(self, *args, **options):
+        server = make_server(
+            key_secret=settings.RAZORPAY_KEY_SECRET,
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            failure_rate=options['failure_rate'],
+            verbose=options['verbose'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake Razorpay listening on http://{options['host']}:{server.server_port} "
+            f"(latency {options['latency']}s, failure rate {options['failure_rate']:.0%})"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,181 @@
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+try:
+    import brotli
+except ImportError:  # optional: without it API responses are only ever gzipped
+    brotli = None
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    whitenoise's middleware is sync-only, and one sync middleware makes Django run the whole
+    stack below it in a thread, blocking on the async views. This one passes non-static
+    requests straight through to an async get_response and only opens static files in a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+# --- API RESPONSE COMPRESSION ---
+# WhiteNoise precompresses static files; this does the same for API JSON, on the fly. Catalog, order
+# and cart payloads repeat the same absolute image URLs many times over and shrink several-fold.
+# Brotli when the client accepts it and the brotli package is installed, else gzip. Responses under
+# MIN_SIZE aren't worth the CPU and go out as they are. Streaming responses are compressed as one
+# stream, flushed after every chunk so nothing is held back. Settings live in settings.API_COMPRESSION.
+# No BREACH padding (unlike Django's GZipMiddleware): API clients authenticate with bearer tokens,
+# which a cross-site page can't make the browser send.
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain', 'text/html')
+
+
+def accepted_encoding(header):
+    """The coding to answer an Accept-Encoding header with: 'br', 'gzip' or None."""
+    qualities = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    wildcard = qualities.get('*', 0.0)
+    offered = ('br', 'gzip') if brotli else ('gzip',)
+    # max() keeps the first of equal qualities, so brotli wins ties
+    best = max(offered, key=lambda coding: qualities.get(coding, wildcard))
+    return best if qualities.get(best, wildcard) > 0 else None
+
+
+class GzipStream:
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+
+    def compress(self, data, flush=True):
+        out = self.compressor.compress(data)
+        return out + self.compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data, flush=True):
+        out = self.compressor.process(data)
+        return out + self.compressor.flush() if flush else out
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+def open_stream(encoding):
+    options = settings.API_COMPRESSION
+    if encoding == 'br':
+        return BrotliStream(options['BROTLI_QUALITY'])
+    return GzipStream(options['GZIP_LEVEL'])
+
+
+def compress_chunks(chunks, stream):
+    for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.finish()
+
+
+async def acompress_chunks(chunks, stream):
+    async for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.finish()
+
+
+class APICompressionMiddleware:
+    """Content-negotiated brotli/gzip for API responses over settings.API_COMPRESSION['MIN_SIZE'] bytes."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        # Compressing is CPU work, so it runs inline rather than in a thread
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        options = settings.API_COMPRESSION
+        if not request.path_info.startswith(tuple(options['PATH_PREFIXES'])) or response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').split(';')[0].strip() not in COMPRESSIBLE_TYPES:
+            return response
+        if not response.streaming and len(response.content) < options['MIN_SIZE']:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        stream = open_stream(encoding)
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_chunks(response.streaming_content, stream)
+            else:
+                response.streaming_content = compress_chunks(response.streaming_content, stream)
+            # The compressed size isn't known until the last chunk is out
+            del response['Content-Length']
+        else:
+            compressed = stream.compress(response.content, flush=False) + stream.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # A strong ETag promises identical bytes; compressed bodies only match weakly (RFC 9110 8.8.1).
+        # CatalogCacheMixin compares If-None-Match weakly, so 304s keep working.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    # Fold double-tap duplicates into the oldest row before the unique constraint goes on
+    CartItem = apps.get_model('bari_app', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('user_id', 'product_id')
+        .annotate(rows=Count('id'), keep=Min('id'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        CartItem.objects.filter(id=dup['keep']).update(quantity=dup['total'])
+        CartItem.objects.filter(user_id=dup['user_id'], product_id=dup['product_id']).exclude(id=dup['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bari_app', '0011_order_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_cart_item'),
+        ),
+    ]
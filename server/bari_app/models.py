@@ -1,7 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 
 # --- 1. PRODUCT MODELS ---
+class ProductQuerySet(models.QuerySet):
+    def catalog(self):
+        # Everything ProductSerializer touches, so listing N products costs 2 queries instead of N+1
+        return self.prefetch_related('images')
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True, null=True)
@@ -13,6 +19,17 @@ class Product(models.Model):
     rating = models.FloatField(default=0.0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # Back the catalog filters (?tag=, price range) and sort orders (price, rating, newest)
+        indexes = [
+            models.Index(fields=['tag'], name='product_tag_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['rating'], name='product_rating_idx'),
+            models.Index(fields=['created_at'], name='product_created_at_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -66,9 +83,29 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # One row per product per user: repeat adds increment it (see services.add_to_cart)
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_item'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
+# --- 4b. STOCK RESERVATIONS ---
+# Stock held for a Razorpay checkout between order creation and payment verification.
+# The reserved quantity is already taken off Product.stock; expired rows are given back.
+class StockReservation(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    reference = models.CharField(max_length=100)  # receipt sent with the Razorpay order (order_rcptid_<user id>)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} held for {self.user.username}"
+
 # --- 5. ORDERS ---
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -85,6 +122,12 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, default='cod') # 'cod' or 'razorpay'
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # A user's history newest-first, and /api/orders/latest/, are a single index range scan/seek
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
@@ -95,4 +138,23 @@ class OrderItem(models.Model):
     price_at_purchase = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.product.name}"
+
+# --- 6. IDEMPOTENCY KEYS ---
+# First response to a keyed checkout/payment request, replayed for client retries (see idempotency.py)
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=100)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # None while in progress
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key', 'endpoint'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.endpoint}) for {self.user.username}"
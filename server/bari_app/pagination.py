@@ -0,0 +1,33 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TiebreakCursorPagination(CursorPagination):
+    """
+    CursorPagination that ends every ordering with id, so rows sharing a price, rating or
+    timestamp come out in the same order on every page instead of repeating or going missing.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        if any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            return ordering
+        return (*ordering, '-id' if ordering[0].startswith('-') else 'id')
+
+
+# --- CATALOG PAGINATION ---
+# Cursor based so the first page (and every page after it) only reads page_size + 1 rows,
+# however big the catalog gets. The ordering comes from the view's OrderingFilter.
+# The id tiebreaker costs no extra index on MySQL: InnoDB secondary indexes already end with the key.
+class ProductCursorPagination(TiebreakCursorPagination):
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-created_at'
+
+
+# --- ORDER HISTORY PAGINATION ---
+class OrderCursorPagination(TiebreakCursorPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    ordering = '-created_at'
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+
+import razorpay
+import requests
+import urllib3
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # optional: acreate_order() then runs the blocking client in a worker thread
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayUnavailable(Exception):
+    """The payment gateway timed out, errored, or the circuit breaker is open. Safe to retry later."""
+
+    def __init__(self, message, retry_after=None):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+# --- PAYMENT GATEWAY ADAPTER ---
+# One razorpay.Client per process, sharing a pooled keep-alive session, so a checkout reuses
+# an open TLS connection instead of handshaking every time. Every call has connect/read
+# timeouts, a couple of jittered retries, and a circuit breaker: after a run of failures we
+# stop calling the gateway for a cooldown and fail fast instead of tying up workers.
+# Settings live in settings.PAYMENT_GATEWAY.
+# A whole call, retries and backoff included, must finish within DEADLINE seconds, kept below the
+# gunicorn worker timeout so a slow gateway fails the request instead of getting the worker killed.
+# Creating an order isn't idempotent, so only failures where the gateway can't have created one
+# are retried: connection errors before anything was sent, and error responses. A read timeout may
+# mean the order exists, so it fails the call at once.
+# Async views (ASGI mode) call acreate_order() instead, which goes out over a pooled httpx
+# AsyncClient when httpx is installed, so a slow gateway parks a coroutine rather than a thread.
+# Both paths share the same retries and circuit breaker.
+
+class TimeoutSession(requests.Session):
+    """requests has no session-wide timeout; apply ours to every request that doesn't set one."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(*args, **kwargs)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go out. After the cooldown one trial call is let through (half-open)."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.opened_at = time.monotonic()  # re-arm so only this caller probes
+                return True
+            return False
+
+    def retry_after(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 0
+            return max(0, int(self.cooldown - (time.monotonic() - self.opened_at)) + 1)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning("Payment gateway circuit opened after %s consecutive failures", self.failures)
+                self.opened_at = time.monotonic()
+
+
+# Failures counted against the gateway; BadRequestError is our fault, not theirs
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    razorpay.errors.ServerError,
+    razorpay.errors.GatewayError,
+)
+ASYNC_TRANSIENT_ERRORS = TRANSIENT_ERRORS + ((httpx.TransportError,) if httpx else ())
+
+
+def retryable(error):
+    """True if the gateway can't have acted on the request, so trying again can't create a second order."""
+    if isinstance(error, (razorpay.errors.ServerError, razorpay.errors.GatewayError)):
+        return True  # it answered with an error
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        # Refused/unreachable, as opposed to a connection dropped after the request went out
+        return isinstance(getattr(error.args[0], 'reason', None), urllib3.exceptions.NewConnectionError)
+    return bool(httpx) and isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+class RazorpayGateway:
+    def __init__(self, key_id, key_secret, base_url, connect_timeout, read_timeout, deadline,
+                 pool_size, max_retries, backoff, breaker_threshold, breaker_cooldown):
+        self.key_id = key_id
+        self.deadline = deadline
+        self.base_url = base_url
+        self.auth = (key_id, key_secret)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+
+        session = TimeoutSession(timeout=(connect_timeout, read_timeout))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        self.session = session
+        self.client = razorpay.Client(session=session, auth=self.auth, base_url=base_url)
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def create_order(self, amount, receipt, currency='INR'):
+        """Create a Razorpay order (amount in paise). Raises GatewayUnavailable on transient failure."""
+        data = {'amount': amount, 'currency': currency, 'receipt': receipt, 'payment_capture': 1}
+        return self._call(lambda timeout: self.client.order.create(data=data, timeout=timeout))
+
+    async def acreate_order(self, amount, receipt, currency='INR'):
+        """create_order() for async views. Same result and errors, without blocking the event loop."""
+        if httpx is None:
+            return await sync_to_async(self.create_order, thread_sensitive=False)(amount, receipt, currency)
+        data = {'amount': amount, 'currency': currency, 'receipt': receipt, 'payment_capture': 1}
+        return await self._acall(self._apost, '/v1/orders', data)
+
+    def ping(self, timeout):
+        """Reachability probe for /readyz: any HTTP answer will do. Skips the retries and the breaker."""
+        self.session.head(self.base_url, timeout=timeout, allow_redirects=False)
+
+    def verify_payment_signature(self, params):
+        # Local HMAC check, no network round-trip: raises razorpay.errors.SignatureVerificationError
+        return self.client.utility.verify_payment_signature(params)
+
+    def _call(self, func):
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            try:
+                result = func(timeout=self._timeouts(deadline))
+            except TRANSIENT_ERRORS as e:
+                time.sleep(self._retry_delay(attempt, e, deadline))
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def _acall(self, func, *args):
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            try:
+                connect, read = self._timeouts(deadline)
+                result = await func(*args, timeout=httpx.Timeout(read, connect=connect))
+            except ASYNC_TRANSIENT_ERRORS as e:
+                await asyncio.sleep(self._retry_delay(attempt, e, deadline))
+            else:
+                self.breaker.record_success()
+                return result
+
+    def _timeouts(self, deadline):
+        """(connect, read) timeouts for the next attempt, cut down so it can't run past the deadline."""
+        remaining = deadline - time.monotonic()
+        connect = min(self.connect_timeout, remaining)
+        return connect, max(min(self.read_timeout, remaining - connect), 0.01)
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise GatewayUnavailable("Payment gateway is unavailable, please retry shortly",
+                                     retry_after=self.breaker.retry_after())
+
+    def _retry_delay(self, attempt, error, deadline):
+        """Count a failed attempt; the backoff before the next one, or GatewayUnavailable if there won't be one."""
+        self.breaker.record_failure()
+        logger.warning("Payment gateway call failed (attempt %s/%s): %s: %s",
+                       attempt + 1, self.max_retries + 1, type(error).__name__, error)
+        # Exponential backoff with full jitter: 0..backoff, 0..2*backoff, ...
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if attempt == self.max_retries or not retryable(error) or time.monotonic() + delay >= deadline:
+            raise GatewayUnavailable("Payment gateway did not respond, please retry",
+                                     retry_after=self.breaker.retry_after()) from error
+        return delay
+
+    def _async_client(self):
+        # httpx connections belong to the event loop that opened them, so keep one pooled client per loop.
+        # No cap on open connections (like the requests pool, which doesn't block either): only idle ones are capped.
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=self.auth,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.pool_size),
+            )
+        return client
+
+    async def _apost(self, path, data, timeout):
+        response = await self._async_client().post(path, json=data, timeout=timeout)
+        if response.is_success:
+            return response.json()
+        # Map errors the way razorpay.Client does for the blocking path
+        try:
+            error = response.json().get('error') or {}
+        except ValueError:
+            error = {}
+        code = str(error.get('code', '')).upper()
+        message = error.get('description', '')
+        if code == 'BAD_REQUEST_ERROR':
+            raise razorpay.errors.BadRequestError(message)
+        if code == 'GATEWAY_ERROR':
+            raise razorpay.errors.GatewayError(message)
+        if response.is_client_error:
+            # 401/403 (bad keys) and other 4xx won't succeed on a retry, unlike ServerError
+            raise razorpay.errors.BadRequestError(message or response.reason_phrase)
+        raise razorpay.errors.ServerError(message)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide gateway adapter, built on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                options = settings.PAYMENT_GATEWAY
+                _gateway = RazorpayGateway(
+                    key_id=settings.RAZORPAY_KEY_ID,
+                    key_secret=settings.RAZORPAY_KEY_SECRET,
+                    base_url=options['BASE_URL'],
+                    connect_timeout=options['CONNECT_TIMEOUT'],
+                    read_timeout=options['READ_TIMEOUT'],
+                    deadline=options['DEADLINE'],
+                    pool_size=options['POOL_SIZE'],
+                    max_retries=options['MAX_RETRIES'],
+                    backoff=options['BACKOFF'],
+                    breaker_threshold=options['BREAKER_THRESHOLD'],
+                    breaker_cooldown=options['BREAKER_COOLDOWN'],
+                )
+    return _gateway
+
+
+@receiver(setting_changed)
+def reset_gateway(setting=None, **kwargs):
+    global _gateway
+    if setting in (None, 'PAYMENT_GATEWAY', 'RAZORPAY_KEY_ID', 'RAZORPAY_KEY_SECRET'):
+        _gateway = None
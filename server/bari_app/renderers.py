@@ -0,0 +1,57 @@
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional: everything below falls back to DRF's stdlib json classes
+    orjson = None
+
+# --- FAST JSON ---
+# Drop-in replacements for DRF's JSONRenderer/JSONParser that use orjson (several times faster on
+# the big nested catalog and order payloads) when it is installed. Output matches DRF's:
+# compact, UTF-8, "Z" for UTC datetimes, and anything orjson doesn't know natively (Decimal,
+# lazy translations, timedelta, QuerySet...) goes through DRF's own encoder, so a bare Decimal
+# still renders as a number and serializer-formatted prices stay strings.
+# One difference: DRF also escapes U+2028/U+2029 for pre-ES2019 JavaScript embedding. Our
+# responses are only ever read with JSON.parse, and that rescan of the whole body cost more
+# than orjson's encoding itself, so it is skipped.
+
+_drf_encoder = JSONEncoder()
+
+ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Pretty printing (?format=json; indent=4, browsable API) is rare: leave it to the stdlib path
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data, default=_drf_encoder.default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which the stdlib handles
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            body = stream.read()
+            if codecs.lookup(encoding).name != 'utf-8':
+                body = body.decode(encoding)
+            # orjson is always strict: NaN/Infinity are rejected, as with STRICT_JSON
+            return orjson.loads(body)
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Product, UserProfile, CartItem, Order, OrderItem, Address, FeaturedProduct, ProductImage
 from rest_framework_simplejwt.tokens import RefreshToken
+from .images import srcset
 
 # --- PRODUCT SERIALIZERS ---
 class ProductSerializer(serializers.ModelSerializer):
@@ -10,10 +11,15 @@ class ProductSerializer(serializers.ModelSerializer):
     # NEW: Add a method field to get the list of gallery image URLs
     images = serializers.SerializerMethodField()
 
+    # Resized variants as srcset strings: {'webp': 'url 160w, ...', 'jpeg': '...'}
+    # images_srcset lines up index-for-index with images
+    image_srcset = serializers.SerializerMethodField()
+    images_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
         # NEW: Added 'images' to this list
-        fields = ['id', 'name', 'description', 'price', 'image', 'images', 'stock', 'weight', 'tag', 'rating', 'created_at']
+        fields = ['id', 'name', 'description', 'price', 'image', 'images', 'image_srcset', 'images_srcset', 'stock', 'weight', 'tag', 'rating', 'created_at']
 
     # NEW: Logic to build the list of URLs
     def get_images(self, obj):
@@ -32,6 +38,34 @@ class ProductSerializer(serializers.ModelSerializer):
         
         return image_list
 
+    def get_image_srcset(self, obj):
+        return srcset(obj.image, self.context.get('request'))
+
+    def get_images_srcset(self, obj):
+        request = self.context.get('request')
+        files = [obj.image] if obj.image else []
+        files += [img.image for img in obj.images.all() if img.image]
+        return [srcset(f, request) for f in files]
+
+# Validates the query params accepted by the product list (?tag=&min_price=&max_price=&in_stock=&ids=)
+class ProductFilterSerializer(serializers.Serializer):
+    tag = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=0)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=0)
+    in_stock = serializers.BooleanField(required=False, allow_null=True, default=None)
+    ids = serializers.CharField(required=False)
+
+    def validate_ids(self, value):
+        try:
+            return [int(pk) for pk in value.split(',') if pk.strip()]
+        except ValueError:
+            raise serializers.ValidationError("Expected a comma separated list of product ids.")
+
+    def validate(self, data):
+        if 'min_price' in data and 'max_price' in data and data['min_price'] > data['max_price']:
+            raise serializers.ValidationError("min_price cannot be greater than max_price.")
+        return data
+
 class FeaturedProductSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
 
@@ -99,6 +133,22 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ('id', 'product', 'quantity', 'added_at')
 
+# Body of PATCH /api/cart/: {"operations": [{"op": "add" | "set" | "remove", "product_id": 1, "quantity": 2}, ...]}
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'])
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(required=False, default=1)
+
+    def validate(self, data):
+        if data['op'] == 'add' and data['quantity'] < 1:
+            raise serializers.ValidationError("add needs a quantity of at least 1.")
+        if data['op'] == 'set' and data['quantity'] < 0:
+            raise serializers.ValidationError("set needs a quantity of 0 or more (0 removes the item).")
+        return data
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
 
@@ -114,6 +164,14 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'items', 'total_price', 'status', 'payment_method', 'created_at')
         read_only_fields = ('user', 'total_price', 'created_at')
 
+# Order header only (?view=summary): no nested items/products, item_count is annotated by the view
+class OrderSummarySerializer(serializers.ModelSerializer):
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'item_count', 'total_price', 'status', 'payment_method', 'created_at')
+
 class AddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
@@ -0,0 +1,139 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import CartItem, Order, OrderItem, Product
+from .inventory import claim_cart_stock
+
+
+class EmptyCartError(Exception):
+    pass
+
+
+class UnknownProductError(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        super().__init__("Unknown products: " + ", ".join(str(pk) for pk in product_ids))
+
+
+# --- CART WRITES ---
+# Increment in the database (F expression) so concurrent "add to cart" taps can't lose an update.
+# Adding to an existing line is one UPDATE; a new line is UPDATE + INSERT, and the unique
+# (user, product) constraint turns a racing duplicate INSERT into a retry of the UPDATE.
+# Raises Product.DoesNotExist for an unknown product.
+def add_to_cart(user, product_id, quantity=1):
+    if CartItem.objects.filter(user=user, product_id=product_id).update(quantity=F('quantity') + quantity):
+        return False
+
+    if not Product.objects.filter(id=product_id).exists():
+        raise Product.DoesNotExist()
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(user=user, product_id=product_id, quantity=quantity)
+        return True
+    except IntegrityError:
+        # Another request created the line between our UPDATE and INSERT...
+        if CartItem.objects.filter(user=user, product_id=product_id).update(quantity=F('quantity') + quantity):
+            return False
+        # ...or there's no line to update: the product was deleted after the check above
+        raise Product.DoesNotExist()
+
+
+def upsert_cart_quantities(user, quantities):
+    """Write {product_id: quantity} as the user's cart lines in one INSERT ... ON CONFLICT UPDATE."""
+    if not quantities:
+        return
+    # MySQL's ON DUPLICATE KEY UPDATE can't name the conflict target; the others require it
+    unique_fields = ['user', 'product'] if connection.features.supports_update_conflicts_with_target else None
+    CartItem.objects.bulk_create(
+        [CartItem(user=user, product_id=pid, quantity=qty) for pid, qty in quantities.items()],
+        update_conflicts=True, unique_fields=unique_fields, update_fields=['quantity'],
+    )
+
+
+# --- BATCH CART EDITS ---
+# PATCH /api/cart/ sends a whole edit session at once. Operations are folded in order over the
+# current cart in memory, then written with at most one product check, one upsert and one
+# delete, whatever the number of operations.
+def fold_cart_operations(current, operations):
+    """Apply [{'op': 'add'|'set'|'remove', 'product_id', 'quantity'}] to a copy of {product_id: qty}. Removed lines end up at 0."""
+    quantities = dict(current)
+    for operation in operations:
+        pid = operation['product_id']
+        if operation['op'] == 'add':
+            quantities[pid] = quantities.get(pid, 0) + operation['quantity']
+        elif operation['op'] == 'set':
+            quantities[pid] = operation['quantity']
+        else:
+            quantities[pid] = 0
+    return quantities
+
+
+def check_products_exist(product_ids):
+    if not product_ids:
+        return
+    known = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+    if set(product_ids) - known:
+        raise UnknownProductError(sorted(set(product_ids) - known))
+
+
+def apply_cart_operations(user, operations):
+    """
+    Apply cart operations (see fold_cart_operations) to the user's cart atomically.
+    Raises UnknownProductError, with nothing written, if an operation adds a product that doesn't exist.
+    """
+    with transaction.atomic():
+        current = dict(
+            CartItem.objects.select_for_update().filter(user=user).values_list('product_id', 'quantity')
+        )
+        quantities = fold_cart_operations(current, operations)
+        check_products_exist([pid for pid, qty in quantities.items() if qty > 0 and pid not in current])
+
+        upsert_cart_quantities(user, {
+            pid: qty for pid, qty in quantities.items() if qty > 0 and qty != current.get(pid)
+        })
+        removed = [pid for pid, qty in quantities.items() if qty <= 0 and pid in current]
+        if removed:
+            CartItem.objects.filter(user=user, product_id__in=removed).delete()
+
+
+# --- ORDER PLACEMENT ---
+# Shared by COD checkout and Razorpay verification. A fixed number of queries whatever the
+# cart size: one cart read (products joined in), the stock claim (see inventory.py),
+# one order insert, one bulk insert, one delete.
+# Raises EmptyCartError, or inventory.OutOfStockError with nothing written. allow_oversell is for
+# payments already captured: the order is placed even if the stock hold expired meanwhile.
+# The cart rows are locked first (lock order: cart, reservations, products), so a concurrent second
+# placement for the same user (double-submitted verify, retry under a new key) waits for this one
+# and then finds the cart empty, instead of ordering the same lines again from a stale read.
+def place_order(user, payment_method='cod', allow_oversell=False):
+    with transaction.atomic():
+        cart_items = list(
+            CartItem.objects.select_for_update(of=('self',)).filter(user=user).select_related('product')
+        )
+        if not cart_items:
+            raise EmptyCartError()
+
+        claim_cart_stock(user, cart_items, allow_oversell=allow_oversell)
+        total_price = sum(item.product.price * item.quantity for item in cart_items)
+
+        order = Order.objects.create(
+            user=user,
+            total_price=total_price,
+            status='Pending',
+            payment_method=payment_method
+        )
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                quantity=item.quantity,
+                price_at_purchase=item.product.price
+            )
+            for item in cart_items
+        ])
+
+        # Only the rows we just ordered, in case another tab added something meanwhile
+        CartItem.objects.filter(id__in=[item.id for item in cart_items]).delete()
+
+    return order
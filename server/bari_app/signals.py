@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product, ProductImage, FeaturedProduct, UserProfile
+from .authentication import revocation_key, revoke_claims
+from .catalog_cache import bump_catalog_version
+from .images import build_variants, delete_variants
+
+
+# Any catalog write (including the admin's list_editable price/stock edits) invalidates cached pages.
+# Bump now, and again on commit, so a page cached from pre-commit data in between is orphaned too.
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=FeaturedProduct)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+# Resize new uploads once, at save time, instead of shipping multi-MB originals to phones
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def build_image_variants(sender, instance, **kwargs):
+    build_variants(instance.image)
+
+
+# ...and drop them with the row, once the delete is committed (a rollback keeps them)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+def delete_image_variants(sender, instance, **kwargs):
+    image = instance.image
+    transaction.on_commit(lambda: delete_variants(image))
+
+
+# UserProfileAPIView caches profile reads for PROFILE_CACHE_TTL; any change to the user or profile drops it
+def profile_cache_key(user_id):
+    return f'profile:{user_id}'
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    cache.delete(profile_cache_key(user_id))
+
+
+# Claim-built reads don't load the User row (authentication.py): flag deactivated and deleted accounts
+@receiver(post_save, sender=User)
+def track_inactive_user(sender, instance, **kwargs):
+    if instance.is_active:
+        cache.delete(revocation_key(instance.pk))
+    else:
+        revoke_claims(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def track_deleted_user(sender, instance, **kwargs):
+    revoke_claims(instance.pk)
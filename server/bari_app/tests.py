@@ -1,3 +1,1352 @@
-from django.test import TestCase
+import base64
+import gzip
+import hashlib
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+import razorpay
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import (
+    Product, ProductImage, FeaturedProduct, CartItem, Order, OrderItem, StockReservation, IdempotencyKey, UserProfile,
+)
+from .images import VARIANT_WIDTHS, variant_name
+from .inventory import release_expired_reservations
+from .services import place_order, EmptyCartError
+from .payments import get_gateway, GatewayUnavailable, httpx
+from .fake_gateway import make_server, sign_payment
+from .cart_store import get_cart_store, cache_lock, cached_product_payloads, CartBusy
+from .catalog_cache import FRESH_KEY, catalog_reads, get_catalog_version
+from .db_router import ReplicaRouter, ReplicaPinMiddleware
+from .renderers import FastJSONRenderer, FastJSONParser, orjson
+from .pagination import ProductCursorPagination
+from .views import ProductListCreateAPIView
+from .async_views import AsyncProductListCreateAPIView, AsyncRazorpayOrderCreateAPIView
+from .middleware import APICompressionMiddleware, accepted_encoding, brotli
+from bari_project.metrics import prometheus_client
+
+
+def make_product(n, **kwargs):
+    product = Product.objects.create(name=f'Product {n}', price=Decimal('10.00') + n, stock=10, **kwargs)
+    ProductImage.objects.create(product=product, image=f'products/gallery/{n}-a.jpg')
+    ProductImage.objects.create(product=product, image=f'products/gallery/{n}-b.jpg')
+    return product
+
+
+# --- QUERY COUNT REGRESSION TESTS ---
+class CatalogQueryCountTests(TestCase):
+    """List endpoints must cost the same number of queries for 1 row or many."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def add_rows(self, start, count):
+        for n in range(start, start + count):
+            product = make_product(n)
+            FeaturedProduct.objects.create(product=product)
+            CartItem.objects.create(user=self.user, product=product, quantity=2)
+            order = Order.objects.create(user=self.user, total_price=product.price)
+            OrderItem.objects.create(order=order, product=product, quantity=1, price_at_purchase=product.price)
+
+    def assertConstantQueries(self, url):
+        self.add_rows(0, 1)
+        baseline = self.count_queries(url)
+        self.add_rows(1, 9)
+        self.assertEqual(self.count_queries(url), baseline, f'{url} query count grows with row count')
+
+    def test_product_list(self):
+        self.assertConstantQueries('/api/products/')
+
+    def test_featured_products(self):
+        self.assertConstantQueries('/api/featured-products/')
+
+    def test_cart(self):
+        self.assertConstantQueries('/api/cart/')
+
+    def test_orders(self):
+        self.assertConstantQueries('/api/orders/')
+
+    def test_product_detail_includes_gallery(self):
+        product = make_product(1)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/products/{product.id}/')
+        self.assertEqual(len(response.data['images']), 2)
+
+
+# --- CATALOG PAGINATION / FILTERING ---
+class ProductListFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.cheap = Product.objects.create(name='Bajra Khichu', price=Decimal('50.00'), stock=5, tag='rajasthani', rating=4.5)
+        self.mid = Product.objects.create(name='Kachri Chutney', price=Decimal('120.00'), stock=0, tag='rajasthani', rating=3.0)
+        self.dear = Product.objects.create(name='Kesar Ghevar', price=Decimal('450.00'), stock=2, tag='sweets', rating=4.9)
+
+    def names(self, query=''):
+        response = self.client.get(f'/api/products/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [p['name'] for p in response.data['results']]
+
+    def test_default_order_is_newest_first(self):
+        self.assertEqual(self.names(), ['Kesar Ghevar', 'Kachri Chutney', 'Bajra Khichu'])
+
+    def test_filters(self):
+        self.assertEqual(self.names('?tag=Rajasthani&ordering=price'), ['Bajra Khichu', 'Kachri Chutney'])
+        self.assertEqual(self.names('?min_price=100&max_price=200'), ['Kachri Chutney'])
+        self.assertEqual(self.names('?in_stock=true&ordering=-rating'), ['Kesar Ghevar', 'Bajra Khichu'])
+        self.assertEqual(self.names(f'?ids={self.cheap.id},{self.dear.id}&ordering=-price'), ['Kesar Ghevar', 'Bajra Khichu'])
+        self.assertEqual(self.names('?search=ghevar'), ['Kesar Ghevar'])
+
+    def test_invalid_filter_is_rejected(self):
+        self.assertEqual(self.client.get('/api/products/?min_price=500&max_price=100').status_code, 400)
+        self.assertEqual(self.client.get('/api/products/?ids=1,abc').status_code, 400)
+
+    def test_cursor_pages_are_bounded(self):
+        for n in range(5):
+            Product.objects.create(name=f'Extra {n}', price=Decimal('10.00') + n)
+        response = self.client.get('/api/products/?page_size=3&ordering=price')
+        self.assertEqual(len(response.data['results']), 3)
+        seen = [p['id'] for p in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [p['id'] for p in response.data['results']]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), Product.objects.count())
+
+    def test_ties_are_broken_by_id(self):
+        # Rows sharing a price or rating must page in the same order every time
+        view = ProductListCreateAPIView()
+        for query, ordering in [({}, ('-created_at', '-id')), ({'ordering': '-rating'}, ('-rating', '-id')),
+                                ({'ordering': 'price'}, ('price', 'id'))]:
+            request = Request(APIRequestFactory().get('/api/products/', query))
+            self.assertEqual(ProductCursorPagination().get_ordering(request, Product.objects.all(), view), ordering)
+
+
+# --- CATALOG CACHE / ETAGS ---
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = make_product(1)
+        FeaturedProduct.objects.create(product=self.product)
+
+    def test_repeat_requests_skip_the_database(self):
+        for url in ['/api/products/', f'/api/products/{self.product.id}/', '/api/featured-products/']:
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.data, second.data)
+            self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_writes_invalidate_cached_pages(self):
+        url = f'/api/products/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+
+        # Same path the admin's list_editable takes: a plain model save
+        self.product.price = Decimal('99.00')
+        self.product.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['price'], '99.00')
+
+        etag = response['ETag']
+        ProductImage.objects.filter(product=self.product).first().delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.data['images']), 1)
+
+    def test_wildcard_does_not_hide_missing_products(self):
+        self.assertEqual(self.client.get(f'/api/products/{self.product.id + 100}/', HTTP_IF_NONE_MATCH='*').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/products/{self.product.id}/', HTTP_IF_NONE_MATCH='*').status_code, 200)
+
+
+# --- IMAGE VARIANTS ---
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+    def upload(self, name, size=(900, 600), mode='RGBA'):
+        buffer = BytesIO()
+        Image.new(mode, size, (200, 120, 40, 128)).save(buffer, format='PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_variants_are_built_on_save(self):
+        product = Product.objects.create(name='Ker Sangri', price=Decimal('80.00'), image=self.upload('ker.png'))
+        ProductImage.objects.create(product=product, image=self.upload('ker-2.png', size=(300, 300)))
+
+        for width in VARIANT_WIDTHS:
+            for fmt in ('webp', 'jpeg'):
+                self.assertTrue(default_storage.exists(variant_name(product.image.name, width, fmt)))
+
+        with default_storage.open(variant_name(product.image.name, 160, 'jpeg')) as f:
+            self.assertEqual(Image.open(f).size, (160, 107))
+        gallery = product.images.get()
+        with default_storage.open(variant_name(gallery.image.name, 640, 'webp')) as f:
+            self.assertEqual(Image.open(f).size, (300, 300))  # never upscaled
+
+    def test_serializer_exposes_srcset(self):
+        product = Product.objects.create(name='Ker Sangri', price=Decimal('80.00'), image=self.upload('ker.png'))
+        data = APIClient().get(f'/api/products/{product.id}/').data
+
+        self.assertIn('-160w.webp 160w', data['image_srcset']['webp'])
+        self.assertIn('-1280w.jpg 1280w', data['image_srcset']['jpeg'])
+        self.assertTrue(data['image_srcset']['webp'].startswith('http://testserver/media/'))
+        self.assertEqual(len(data['images_srcset']), len(data['images']))
+
+    def test_srcset_waits_for_variants(self):
+        product = Product.objects.create(name='Ker Sangri', price=Decimal('80.00'), image=self.upload('ker.png'))
+        default_storage.delete(variant_name(product.image.name, VARIANT_WIDTHS[-1], 'jpeg'))
+        cache.clear()
+
+        data = APIClient().get(f'/api/products/{product.id}/').data
+        self.assertIsNone(data['image_srcset'])  # the client falls back to the original
+
+    def test_source_extension_keeps_variants_apart(self):
+        self.assertNotEqual(variant_name('products/ker.png', 160, 'webp'), variant_name('products/ker.jpg', 160, 'webp'))
+
+    def test_variants_are_deleted_with_the_image(self):
+        product = Product.objects.create(name='Ker Sangri', price=Decimal('80.00'), image=self.upload('ker.png'))
+        names = [variant_name(product.image.name, width, 'webp') for width in VARIANT_WIDTHS]
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+
+# --- PAYMENT GATEWAY ---
+class FakeGatewayMixin:
+    """Runs the fake Razorpay API in a thread and points the shared gateway client at it."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.gateway_server = make_server(key_secret=settings.RAZORPAY_KEY_SECRET)
+        threading.Thread(target=cls.gateway_server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.gateway_server.server_close)
+        cls.addClassCleanup(cls.gateway_server.shutdown)
+
+    def setUp(self):
+        super().setUp()
+        self.gateway_server.latency = 0
+        self.gateway_server.failure_rate = 0
+        self.gateway_server.order_calls = 0
+        override = override_settings(PAYMENT_GATEWAY={
+            **settings.PAYMENT_GATEWAY,
+            'BASE_URL': f'http://127.0.0.1:{self.gateway_server.server_port}',
+            'READ_TIMEOUT': 0.5,
+            'BACKOFF': 0.01,
+            'MAX_RETRIES': 1,
+            'BREAKER_THRESHOLD': 4,
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def paid(self, order_id='order_1', payment_id='pay_1'):
+        return {
+            'razorpay_order_id': order_id,
+            'razorpay_payment_id': payment_id,
+            'razorpay_signature': sign_payment(order_id, payment_id, settings.RAZORPAY_KEY_SECRET),
+        }
+
+
+class PaymentGatewayTests(FakeGatewayMixin, TestCase):
+    def test_client_is_shared_and_pooled(self):
+        gateway = get_gateway()
+        first = gateway.create_order(amount=1000, receipt='r-1')
+        second = get_gateway().create_order(amount=2500, receipt='r-2')
+
+        self.assertIs(get_gateway(), gateway)
+        self.assertEqual((first['amount'], second['amount']), (1000, 2500))
+        self.assertNotEqual(first['id'], second['id'])
+
+    def test_read_timeout_is_not_retried(self):
+        # The gateway may have created the order before we stopped waiting: retrying could make a second one
+        self.gateway_server.latency = 1.0  # READ_TIMEOUT is 0.5
+        with self.assertRaises(GatewayUnavailable):
+            get_gateway().create_order(amount=1000, receipt='r-1')
+        self.assertEqual(self.gateway_server.order_calls, 1)
+
+    def test_error_responses_are_retried(self):
+        self.gateway_server.failure_rate = 1
+        with self.assertRaises(GatewayUnavailable):
+            get_gateway().create_order(amount=1000, receipt='r-1')
+        self.assertEqual(self.gateway_server.order_calls, 2)  # first try + MAX_RETRIES
+
+    def test_refused_connections_are_retried(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]  # nothing listens here once the socket is closed
+        with override_settings(PAYMENT_GATEWAY={**settings.PAYMENT_GATEWAY, 'BASE_URL': f'http://127.0.0.1:{port}'}), \
+                mock.patch('bari_app.payments.time.sleep') as sleep:
+            with self.assertRaises(GatewayUnavailable):
+                get_gateway().create_order(amount=1000, receipt='r-1')
+        self.assertEqual(sleep.call_count, 1)
+
+    def test_deadline_bounds_the_whole_call(self):
+        self.gateway_server.latency = 1.0
+        with override_settings(PAYMENT_GATEWAY={**settings.PAYMENT_GATEWAY, 'DEADLINE': 0.2}):
+            started = time.monotonic()
+            with self.assertRaises(GatewayUnavailable):
+                get_gateway().create_order(amount=1000, receipt='r-1')
+        self.assertLess(time.monotonic() - started, 0.5)  # READ_TIMEOUT alone is 0.5
+
+    def test_circuit_opens_after_repeated_failures(self):
+        self.gateway_server.failure_rate = 1
+        gateway = get_gateway()
+        for _ in range(2):
+            with self.assertRaises(GatewayUnavailable):
+                gateway.create_order(amount=1000, receipt='r-1')
+        calls = self.gateway_server.order_calls
+        self.assertEqual(calls, 4)
+
+        # Open: fail fast without touching the network
+        with self.assertRaises(GatewayUnavailable) as ctx:
+            gateway.create_order(amount=1000, receipt='r-1')
+        self.assertEqual(self.gateway_server.order_calls, calls)
+        self.assertGreater(ctx.exception.retry_after, 0)
+
+    def test_signature_verification(self):
+        get_gateway().verify_payment_signature(self.paid())
+        bad = {**self.paid(), 'razorpay_signature': 'forged'}
+        with self.assertRaises(razorpay.errors.SignatureVerificationError):
+            get_gateway().verify_payment_signature(bad)
+
+
+# --- CHECKOUT ---
+class CheckoutTests(FakeGatewayMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, lines):
+        for n in range(lines):
+            product = Product.objects.create(name=f'Product {n}', price=Decimal('10.00') + n, stock=100)
+            CartItem.objects.create(user=self.user, product=product, quantity=2)
+
+    def checkout_queries(self, lines):
+        self.fill_cart(lines)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/checkout/', {'payment_method': 'cod'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return len(ctx.captured_queries)
+
+    def test_checkout_moves_cart_into_order(self):
+        self.fill_cart(3)
+        response = self.client.post('/api/checkout/', {}, format='json')
+        order = Order.objects.get(id=response.data['order_id'])
+
+        self.assertEqual(order.total_price, Decimal('66.00'))  # (10 + 11 + 12) * 2
+        self.assertEqual(order.items.count(), 3)
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.post('/api/checkout/', {}, format='json').status_code, 400)
+
+    def test_second_placement_finds_the_cart_empty(self):
+        # e.g. a double-submitted verify: the cart rows are locked first, so the second one waits, then sees nothing
+        self.fill_cart(2)
+        with CaptureQueriesContext(connection) as ctx:
+            place_order(self.user, 'razorpay', allow_oversell=True)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', next(q['sql'] for q in ctx.captured_queries if 'bari_app_cartitem' in q['sql']))
+        with self.assertRaises(EmptyCartError):
+            place_order(self.user, 'razorpay', allow_oversell=True)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_checkout_keeps_cached_catalog_pages(self):
+        # Stock changes alone don't bump the catalog version (see inventory.apply_stock_deltas)
+        self.fill_cart(2)
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/checkout/', {}, format='json').status_code, 201)
+        self.assertEqual(get_catalog_version(), version)
+
+    def test_checkout_query_count_is_bounded(self):
+        single = self.checkout_queries(1)
+        self.assertEqual(self.checkout_queries(30), single)
+
+    def test_razorpay_verify_uses_same_placement(self):
+        self.fill_cart(2)
+        response = self.client.post('/api/payment/verify/', self.paid(), format='json')
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(id=response.data['order_id'])
+        self.assertEqual(order.payment_method, 'razorpay')
+        self.assertEqual(order.items.count(), 2)
+
+    def test_razorpay_verify_rejects_bad_signature(self):
+        self.fill_cart(1)
+        payload = {**self.paid(), 'razorpay_signature': 'forged'}
+        self.assertEqual(self.client.post('/api/payment/verify/', payload, format='json').status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+# --- INVENTORY ---
+class InventoryTests(FakeGatewayMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.ghevar = Product.objects.create(name='Ghevar', price=Decimal('300.00'), stock=5)
+        self.khichu = Product.objects.create(name='Khichu', price=Decimal('40.00'), stock=1)
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.stock
+
+    def test_checkout_decrements_stock(self):
+        CartItem.objects.create(user=self.user, product=self.ghevar, quantity=2)
+        CartItem.objects.create(user=self.user, product=self.khichu, quantity=1)
+
+        self.assertEqual(self.client.post('/api/checkout/', {}, format='json').status_code, 201)
+        self.assertEqual(self.stock(self.ghevar), 3)
+        self.assertEqual(self.stock(self.khichu), 0)
+
+    def test_oversell_is_rejected_without_side_effects(self):
+        CartItem.objects.create(user=self.user, product=self.ghevar, quantity=2)
+        CartItem.objects.create(user=self.user, product=self.khichu, quantity=3)
+
+        response = self.client.post('/api/checkout/', {}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['out_of_stock'], [{'id': self.khichu.id, 'name': 'Khichu', 'available': 1}])
+        self.assertEqual(self.stock(self.ghevar), 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 2)
+
+    def test_razorpay_reservation_is_claimed_once(self):
+        CartItem.objects.create(user=self.user, product=self.ghevar, quantity=2)
+
+        self.assertEqual(self.client.post('/api/payment/create/', {}, format='json').status_code, 200)
+        self.assertEqual(self.stock(self.ghevar), 3)  # held while the customer pays
+        # Creating the payment again (e.g. closed and reopened the popup) doesn't hold twice
+        self.client.post('/api/payment/create/', {}, format='json')
+        self.assertEqual(self.stock(self.ghevar), 3)
+
+        self.assertEqual(self.client.post('/api/payment/verify/', self.paid(), format='json').status_code, 201)
+        self.assertEqual(self.stock(self.ghevar), 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_reservations_are_released(self):
+        CartItem.objects.create(user=self.user, product=self.ghevar, quantity=4)
+        self.client.post('/api/payment/create/', {}, format='json')
+        self.assertEqual(self.stock(self.ghevar), 1)
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(self.stock(self.ghevar), 5)
+
+    def test_paid_order_is_placed_after_hold_expired(self):
+        CartItem.objects.create(user=self.user, product=self.khichu, quantity=1)
+        self.client.post('/api/payment/create/', {}, format='json')
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired_reservations()
+        Product.objects.filter(id=self.khichu.id).update(stock=0)  # someone else bought the last one
+
+        with self.assertLogs('bari_app.inventory', 'WARNING'):
+            response = self.client.post('/api/payment/verify/', self.paid(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(self.khichu), -1)  # shows up in the admin for reconciliation
+
+    def test_failed_gateway_call_releases_hold(self):
+        self.gateway_server.failure_rate = 1
+        CartItem.objects.create(user=self.user, product=self.ghevar, quantity=2)
+
+        self.assertEqual(self.client.post('/api/payment/create/', {}, format='json').status_code, 503)
+        self.assertEqual(self.stock(self.ghevar), 5)
+
+
+# --- IDEMPOTENCY KEYS ---
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        product = Product.objects.create(name='Ghevar', price=Decimal('300.00'), stock=5)
+        CartItem.objects.create(user=self.user, product=product, quantity=1)
+
+    def checkout(self, key, **data):
+        return self.client.post('/api/checkout/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.checkout('k-1', payment_method='cod')
+        self.assertEqual(first.status_code, 201)
+
+        retry = self.checkout('k-1', payment_method='cod')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_replay_survives_cache_loss(self):
+        first = self.checkout('k-1')
+        cache.clear()
+        self.assertEqual(self.checkout('k-1').data, first.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_reused_key_with_different_body_is_rejected(self):
+        self.checkout('k-1', payment_method='cod')
+        self.assertEqual(self.checkout('k-1', payment_method='razorpay').status_code, 422)
+
+    def test_abandoned_key_is_taken_over_after_lease(self):
+        # What a worker killed mid-request leaves behind: a claimed key with no result
+        IdempotencyKey.objects.create(user=self.user, key='k-1', endpoint='/api/checkout/',
+                                      request_hash=hashlib.sha256(b'{}').hexdigest())
+        in_progress = self.checkout('k-1')
+        self.assertEqual((in_progress.status_code, in_progress.data['code']), (409, 'in_progress'))  # keep the key
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_LEASE + 1))
+        self.assertEqual(self.checkout('k-1').status_code, 201)
+        self.assertEqual(self.checkout('k-1')['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.assertEqual(self.client.post('/api/checkout/', {}, format='json').status_code, 201)
+        self.assertEqual(self.client.post('/api/checkout/', {}, format='json').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+# --- ORDER HISTORY ---
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_orders(self, count, lines=3):
+        for n in range(count):
+            order = Order.objects.create(user=self.user, total_price=Decimal('100.00'))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=make_product(n * lines + i), quantity=2, price_at_purchase=Decimal('10.00'))
+                for i in range(lines)
+            ])
+
+    def test_history_is_paginated(self):
+        self.make_orders(12, lines=1)
+        response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(self.client.get(response.data['next']).data['results']), 2)
+
+    def test_summary_is_a_single_query(self):
+        self.make_orders(5)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/?view=summary')
+        header = response.data['results'][0]
+        self.assertEqual(header['item_count'], 6)
+        self.assertNotIn('items', header)
+
+    def test_detail_is_prefetched_and_private(self):
+        self.make_orders(1, lines=5)
+        order = Order.objects.get()
+        with self.assertNumQueries(3):  # order, items + products, gallery images
+            response = self.client.get(f'/api/orders/{order.id}/')
+        self.assertEqual(len(response.data['items']), 5)
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='secret-pass-123'))
+        self.assertEqual(other.get(f'/api/orders/{order.id}/').status_code, 404)
+
+    def test_latest_order(self):
+        self.assertEqual(self.client.get('/api/orders/latest/').status_code, 404)
+        self.make_orders(3, lines=1)
+        newest = Order.objects.order_by('-created_at', '-id').first()
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/orders/latest/')
+        self.assertEqual(response.data['id'], newest.id)
+
+    def test_checkout_returns_the_placed_order(self):
+        product = make_product(1)
+        CartItem.objects.create(user=self.user, product=product, quantity=3)
+        response = self.client.post('/api/checkout/', {}, format='json')
+
+        self.assertEqual(response.data['order']['id'], response.data['order_id'])
+        self.assertEqual(response.data['order']['total_price'], '33.00')
+        self.assertEqual(response.data['order']['items'][0]['product']['name'], 'Product 1')
+
+
+# --- CART ---
+class CartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Ghevar', price=Decimal('300.00'), stock=5)
+
+    def add(self, product_id, quantity=1):
+        return self.client.post('/api/cart/', {'product_id': product_id, 'quantity': quantity}, format='json')
+
+    def test_repeated_adds_increment_one_line(self):
+        self.assertEqual(self.add(self.product.id, 2).status_code, 200)
+        with self.assertNumQueries(1):  # existing line: a single UPDATE ... quantity + n
+            self.add(self.product.id, 3)
+        self.assertEqual(CartItem.objects.get(user=self.user).quantity, 5)
+
+    def test_bad_input(self):
+        self.assertEqual(self.add(self.product.id + 100).status_code, 404)
+        self.assertEqual(self.add('abc').status_code, 400)
+        self.assertEqual(self.add(self.product.id, 0).status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_product_deleted_mid_add_is_404(self):
+        # The INSERT fails on the product foreign key, not the unique line: nothing to fall back to
+        with mock.patch.object(CartItem.objects, 'create', side_effect=IntegrityError('foreign key')):
+            self.assertEqual(self.add(self.product.id).status_code, 404)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_summary_is_one_aggregate_query(self):
+        other = Product.objects.create(name='Kachori', price=Decimal('50.50'), stock=5)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/cart/summary/').data, {'item_count': 0, 'subtotal': '0.00'})
+        self.add(self.product.id, 2)
+        self.add(other.id, 3)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/cart/summary/')
+        self.assertEqual(response.data, {'item_count': 5, 'subtotal': '751.50'})
+
+    def patch(self, *operations):
+        return self.client.patch('/api/cart/', {'operations': list(operations)}, format='json')
+
+    def test_batch_operations(self):
+        other = Product.objects.create(name='Kachori', price=Decimal('50.00'), stock=5)
+        gone = Product.objects.create(name='Samosa', price=Decimal('20.00'), stock=5)
+        self.add(self.product.id, 1)
+        self.add(gone.id, 1)
+
+        response = self.patch(
+            {'op': 'add', 'product_id': self.product.id, 'quantity': 2},
+            {'op': 'add', 'product_id': other.id},
+            {'op': 'set', 'product_id': other.id, 'quantity': 4},
+            {'op': 'remove', 'product_id': gone.id},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['item_count'], 7)
+        self.assertEqual(response.data['subtotal'], '1100.00')
+        self.assertEqual(
+            dict(CartItem.objects.values_list('product_id', 'quantity')),
+            {self.product.id: 3, other.id: 4},
+        )
+
+    def test_batch_query_count_does_not_grow_with_operations(self):
+        products = [make_product(n) for n in range(10)]
+
+        def ops_for(chunk):
+            return [{'op': 'add', 'product_id': p.id, 'quantity': 2} for p in chunk]
+
+        with CaptureQueriesContext(connection) as small:
+            self.patch(*ops_for(products[:1]))
+        with CaptureQueriesContext(connection) as large:
+            self.patch(*ops_for(products[1:]))
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_batch_is_all_or_nothing(self):
+        self.add(self.product.id, 1)
+        response = self.patch(
+            {'op': 'set', 'product_id': self.product.id, 'quantity': 5},
+            {'op': 'add', 'product_id': self.product.id + 100},
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['product_ids'], [self.product.id + 100])
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+        self.assertEqual(self.patch({'op': 'add', 'product_id': self.product.id, 'quantity': 0}).status_code, 400)
+        self.assertEqual(self.patch().status_code, 400)
+
+
+@override_settings(CART_STORE='cache', CART_WRITE_BEHIND=False)
+class CacheCartStoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.products = [make_product(n) for n in range(3)]
+
+    def add(self, product, quantity=1):
+        return self.client.post('/api/cart/', {'product_id': product.id, 'quantity': quantity}, format='json')
+
+    def test_cart_lives_in_the_cache_until_persisted(self):
+        self.add(self.products[0], 2)
+        self.add(self.products[0], 1)
+        self.add(self.products[1])
+        self.assertFalse(CartItem.objects.exists())
+
+        self.client.get('/api/cart/')  # warms the product payloads
+        with self.assertNumQueries(0):
+            items = self.client.get('/api/cart/').data
+        self.assertEqual([(i['product']['id'], i['quantity']) for i in items],
+                         [(self.products[0].id, 3), (self.products[1].id, 1)])
+
+        get_cart_store().persist(self.user)
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')),
+                         {self.products[0].id: 3, self.products[1].id: 1})
+
+    def test_batch_and_persist_removals(self):
+        self.add(self.products[0])
+        self.add(self.products[1])
+        get_cart_store().persist(self.user)
+
+        response = self.client.patch('/api/cart/', {'operations': [
+            {'op': 'remove', 'product_id': self.products[0].id},
+            {'op': 'set', 'product_id': self.products[2].id, 'quantity': 2},
+        ]}, format='json')
+        self.assertEqual(response.data['item_count'], 3)
+        self.assertEqual(response.data['subtotal'], '35.00')
+
+        get_cart_store().persist(self.user)
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')),
+                         {self.products[1].id: 1, self.products[2].id: 2})
+
+    def test_checkout_writes_the_cart_back_first(self):
+        self.add(self.products[0], 2)
+        response = self.client.post('/api/checkout/', {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['order']['total_price'], '20.00')
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.get('/api/cart/').data, [])
+
+    def test_unknown_product(self):
+        self.assertEqual(self.client.post('/api/cart/', {'product_id': 999}, format='json').status_code, 404)
+
+    def test_summary_from_the_cache(self):
+        self.add(self.products[1], 2)
+        self.client.get('/api/cart/summary/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/cart/summary/')
+        self.assertEqual(response.data, {'item_count': 2, 'subtotal': '22.00'})
+
+
+    def test_lock_is_owned(self):
+        with cache_lock('cart-lock:test'):
+            with self.assertRaises(CartBusy):
+                with cache_lock('cart-lock:test', wait=0.05):
+                    pass
+            self.assertIsNotNone(cache.get('cart-lock:test'))  # the failed attempt didn't release ours
+
+            cache.set('cart-lock:test', 'someone-else')  # ours expired and was taken over
+        self.assertEqual(cache.get('cart-lock:test'), 'someone-else')
+
+    def test_busy_cart_answers_503(self):
+        cache.add(f'cart-lock:{self.user.id}', 'other-worker', timeout=5)
+        response = self.add(self.products[0])
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_adds_wait_for_direct_writes(self):
+        self.add(self.products[0])
+        store = get_cart_store()
+        with store.direct_writes(self.user):
+            self.assertEqual(self.add(self.products[1]).status_code, 503)  # not lost behind our back
+            CartItem.objects.filter(user=self.user).delete()
+        self.add(self.products[2])
+        store.persist(self.user)
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')), {self.products[2].id: 1})
+
+    def test_item_edit_by_id_reloads_the_cart(self):
+        self.add(self.products[0])
+        store = get_cart_store()
+        store.persist(self.user)
+        item = CartItem.objects.get(user=self.user)
+        self.assertEqual(self.client.put(f'/api/cart/{item.id}/', {'quantity': 4}, format='json').status_code, 200)
+        self.assertEqual([i['quantity'] for i in self.client.get('/api/cart/').data], [4])
+
+
+# Write-behind persists on another thread (and DB connection), which only sees committed rows
+@override_settings(CART_STORE='cache', CART_WRITE_BEHIND=True)
+class CartWriteBehindTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.products = [make_product(n) for n in range(2)]
+
+    def flush(self):
+        # One write-back thread, in order: once a no-op queued now has run, earlier write-backs have too
+        get_cart_store().executor.submit(lambda: None).result(timeout=5)
+
+    def test_edits_are_written_back(self):
+        self.client.post('/api/cart/', {'product_id': self.products[0].id, 'quantity': 2}, format='json')
+        self.client.post('/api/cart/', {'product_id': self.products[1].id}, format='json')
+        self.flush()
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')),
+                         {self.products[0].id: 2, self.products[1].id: 1})
+
+        self.client.patch('/api/cart/', {'operations': [{'op': 'remove', 'product_id': self.products[0].id}]},
+                          format='json')
+        self.flush()
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')), {self.products[1].id: 1})
+
+
+# --- GUEST CARTS ---
+class GuestCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.products = [make_product(n) for n in range(3)]
+
+    def add(self, product, quantity=1, token=None):
+        headers = {'HTTP_X_CART_TOKEN': token} if token else {}
+        return self.client.post('/api/cart/', {'product_id': product.id, 'quantity': quantity}, format='json', **headers)
+
+    def test_guest_cart_round_trip(self):
+        first = self.add(self.products[0], 2)
+        token = first.data['cart_token']
+        self.assertEqual(first['X-Cart-Token'], token)
+        self.add(self.products[0], 1, token=token)
+        self.add(self.products[1], 1, token=token)
+
+        items = self.client.get('/api/cart/', HTTP_X_CART_TOKEN=token).data
+        self.assertEqual([(i['product']['id'], i['quantity']) for i in items],
+                         [(self.products[0].id, 3), (self.products[1].id, 1)])
+        self.assertEqual(self.client.get('/api/cart/summary/', HTTP_X_CART_TOKEN=token).data['item_count'], 4)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_forged_token_is_ignored(self):
+        token = self.add(self.products[0]).data['cart_token']
+        forged = token[:-1] + ('a' if token[-1] != 'a' else 'b')
+        self.assertEqual(self.client.get('/api/cart/', HTTP_X_CART_TOKEN=forged).data, [])
+        self.assertNotEqual(self.add(self.products[0], token=forged).data['cart_token'], token)
+
+    def test_login_merges_guest_cart_with_one_upsert(self):
+        CartItem.objects.create(user=self.user, product=self.products[0], quantity=1)
+        token = self.add(self.products[0], 2).data['cart_token']
+        self.add(self.products[1], 1, token=token)
+        self.add(self.products[2], 1, token=token)
+        self.products[2].delete()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/users/login/', {'username': 'buyer', 'password': 'secret-pass-123'},
+                                        format='json', HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.status_code, 200)
+        cart_inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "bari_app_cartitem"')]
+        self.assertEqual(len(cart_inserts), 1)
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')),
+                         {self.products[0].id: 3, self.products[1].id: 1})
+        self.assertEqual(self.client.get('/api/cart/', HTTP_X_CART_TOKEN=token).data, [])
+
+
+# --- STATELESS JWT READS ---
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+        response = self.client.post('/api/users/login/', {'username': 'buyer', 'password': 'secret-pass-123'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_reads_skip_the_user_query(self):
+        with self.assertNumQueries(1):  # just the cart aggregate
+            self.assertEqual(self.client.get('/api/cart/summary/').status_code, 200)
+
+    def test_tokens_without_claims_still_work(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        with self.assertNumQueries(2):  # user row, then the aggregate
+            self.assertEqual(self.client.get('/api/cart/summary/').status_code, 200)
+
+    def test_deactivated_and_deleted_users_lose_read_access(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/cart/summary/').status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get('/api/cart/summary/').status_code, 200)
+
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/cart/summary/').status_code, 401)
+
+    def test_writes_load_the_real_user(self):
+        product = make_product(1)
+        self.assertEqual(self.client.post('/api/cart/', {'product_id': product.id}, format='json').status_code, 200)
+        self.assertEqual(CartItem.objects.get().user, self.user)
+
+    def test_profile_reads_are_cached_until_changed(self):
+        self.assertEqual(self.client.get('/api/users/profile/').data['username'], 'buyer')
+        with self.assertNumQueries(0):
+            self.client.get('/api/users/profile/')
+
+        self.client.patch('/api/users/profile/', {'first_name': 'Asha', 'phone': '9999999999'}, format='json')
+        profile = self.client.get('/api/users/profile/').data
+        self.assertEqual((profile['first_name'], profile['phone']), ('Asha', '9999999999'))
+
+
+# --- CREDENTIAL THROTTLING ---
+@override_settings(CREDENTIAL_THROTTLE_RATES={'ip': '5/min', 'username': '3/min'})
+class CredentialThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+
+    def login(self, username='buyer', password='wrong-password', **extra):
+        return self.client.post('/api/users/login/', {'username': username, 'password': password}, format='json', **extra)
+
+    def test_per_username_bucket(self):
+        for _ in range(3):
+            self.assertEqual(self.login().status_code, 401)
+        throttled = self.login(password='secret-pass-123')
+        self.assertEqual(throttled.status_code, 429)
+        self.assertIn('Retry-After', throttled)
+        # Other accounts, and the same account from another address, are unaffected
+        self.assertEqual(self.login(username='someone-else').status_code, 401)
+        self.assertEqual(self.login(password='secret-pass-123', REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_per_ip_bucket(self):
+        for n in range(5):
+            self.assertEqual(self.login(username=f'user-{n}').status_code, 401)
+        self.assertEqual(self.login(username='user-6').status_code, 429)
+        self.assertEqual(self.login(username='user-7', REMOTE_ADDR='10.0.0.2').status_code, 401)
+
+    def test_forwarded_for_is_not_trusted(self):
+        for n in range(5):
+            self.assertEqual(self.login(username=f'user-{n}', HTTP_X_FORWARDED_FOR=f'10.1.0.{n}').status_code, 401)
+        self.assertEqual(self.login(username='user-6', HTTP_X_FORWARDED_FOR='10.1.0.6').status_code, 429)
+
+    def test_successful_checks_are_free(self):
+        for _ in range(10):
+            self.assertEqual(self.login(password='secret-pass-123').status_code, 200)
+
+    def test_basic_auth_is_not_accepted(self):
+        # A password hash per request is exactly the cost the JWT login exists to avoid
+        self.client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'buyer:secret-pass-123').decode())
+        with mock.patch('bari_app.authentication.authenticate') as check:
+            self.assertEqual(self.client.get('/api/orders/').status_code, 401)
+        check.assert_not_called()
+
+
+# --- LOGIN ---
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', password='secret-pass-123')
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post('/api/users/login/', {'username': 'buyer', 'password': 'secret-pass-123'}, format='json')
+
+    def test_login_is_one_query(self):
+        UserProfile.objects.create(user=self.user, phone='9999999999')
+        with self.assertNumQueries(1):
+            response = self.login()
+        self.assertEqual(response.data['mobile'], '9999999999')
+
+    def test_profile_is_created_lazily_on_write(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.login().data['mobile'], '')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/users/profile/').data['username'], 'buyer')
+        self.assertFalse(UserProfile.objects.exists())
+
+        self.client.patch('/api/users/profile/', {'phone': '9999999999'}, format='json')
+        self.assertEqual(UserProfile.objects.get().phone, '9999999999')
+
+
+# --- READ REPLICA ROUTING ---
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def with_replica(self):
+        return mock.patch('bari_app.db_router.replica_enabled', return_value=True)
+
+    def route(self, request):
+        # What the router picks for catalog and cart reads while `request` is being handled
+        seen = {}
+
+        def view(request):
+            seen['product'] = self.router.db_for_read(Product)
+            seen['cart'] = self.router.db_for_read(CartItem)
+            return HttpResponse()
+
+        ReplicaPinMiddleware(view)(request)
+        return seen
+
+    def test_without_a_replica_everything_uses_default(self):
+        self.assertEqual(self.route(self.factory.get('/api/products/')), {'product': 'default', 'cart': 'default'})
+
+    def test_catalog_reads_go_to_the_replica(self):
+        with self.with_replica():
+            self.assertEqual(self.route(self.factory.get('/api/products/')), {'product': 'replica', 'cart': 'default'})
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+            self.assertFalse(self.router.allow_migrate('replica', 'bari_app'))
+
+    def test_reads_after_own_write_stick_to_the_primary(self):
+        alice = {'HTTP_AUTHORIZATION': 'Bearer alice'}
+        with self.with_replica():
+            self.assertEqual(self.route(self.factory.post('/api/checkout/', **alice))['product'], 'default')
+            self.assertEqual(self.route(self.factory.get('/api/orders/', **alice))['product'], 'default')
+            # Other clients keep reading from the replica
+            self.assertEqual(self.route(self.factory.get('/api/orders/', HTTP_AUTHORIZATION='Bearer bob'))['product'], 'replica')
+
+    def test_cache_fills_after_a_catalog_write_read_the_primary(self):
+        # Any client's miss would otherwise store the lagging replica's data under the new version
+        with self.with_replica():
+            product = make_product(1)  # bumps the catalog version
+            # There is no 'replica' alias in tests, so a replica read would raise here
+            self.assertEqual(APIClient().get(f'/api/products/{product.id}/').status_code, 200)
+            self.assertEqual(list(cached_product_payloads([product.id])), [product.id])
+
+            cache.delete(FRESH_KEY)
+            with catalog_reads():
+                self.assertEqual(self.router.db_for_read(Product), 'replica')
+
+
+# --- FAST JSON ---
+class FastJSONTests(TestCase):
+    payload = {
+        'price': Decimal('10.50'),
+        'created_at': timezone.make_aware(datetime(2024, 5, 1, 12, 30, 15, 123456), dt_timezone.utc),
+        'local': timezone.make_aware(datetime(2024, 5, 1, 18, 0), dt_timezone(timedelta(hours=5, minutes=30))),
+        'day': date(2024, 5, 1),
+        'label': gettext_lazy('Cart'),
+        'quantities': {1: 2, 7: 1},
+        'note': 'chilli & jaggery, ₹ 499',
+        'nested': [{'id': 1, 'ok': True, 'none': None}],
+    }
+
+    @skipUnless(orjson, "orjson is not installed")
+    def test_output_matches_drf(self):
+        self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    @skipUnless(orjson, "orjson is not installed")
+    def test_line_separators_are_left_unescaped(self):
+        data = {'note': 'line\u2028separator'}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), data)
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch('bari_app.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+            self.assertEqual(FastJSONParser().parse(BytesIO(b'{"a": [1, 2.5]}')), {'a': [1, 2.5]})
+
+    @skipUnless(orjson, "orjson is not installed")
+    def test_parser(self):
+        self.assertEqual(FastJSONParser().parse(BytesIO('{"name": "कचौरी", "qty": 2}'.encode())), {'name': 'कचौरी', 'qty': 2})
+        for bad in (b'{"a": ', b'{"a": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(bad))
+
+    def test_api_round_trip(self):
+        make_product(1)
+        response = self.client.get('/api/products/')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['results'][0]['price'], '11.00')
+
+
+# --- ASYNC (ASGI) VIEWS ---
+class AsyncViewTests(FakeGatewayMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com')
+        UserProfile.objects.create(user=self.user, phone='9999999999')
+        self.factory = APIRequestFactory()
+        self.ghevar = Product.objects.create(name='Ghevar', price=Decimal('300.00'), stock=5)
+
+    def create_payment(self):
+        request = self.factory.post('/api/payment/create/', {}, format='json')
+        force_authenticate(request, self.user)
+        return async_to_sync(AsyncRazorpayOrderCreateAPIView.as_view())(request)
+
+    def test_payment_creation(self):
+        CartItem.objects.create(user=self.user, product=self.ghevar, quantity=2)
+        response = self.create_payment()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['amount'], 60000)
+        self.assertEqual(response.data['user_phone'], '9999999999')
+        self.assertEqual(self.gateway_server.order_calls, 1)
+        self.ghevar.refresh_from_db()
+        self.assertEqual(self.ghevar.stock, 3)
+
+    def test_payment_errors_match_sync_view(self):
+        self.assertEqual(self.create_payment().status_code, 400)  # empty cart
+
+        CartItem.objects.create(user=self.user, product=self.ghevar, quantity=2)
+        self.gateway_server.failure_rate = 1
+        self.assertEqual(self.create_payment().status_code, 503)
+        self.assertEqual(self.gateway_server.order_calls, 2)  # first try + MAX_RETRIES
+        self.assertFalse(StockReservation.objects.exists())
+
+        request = self.factory.post('/api/payment/create/', {}, format='json')
+        self.assertEqual(async_to_sync(AsyncRazorpayOrderCreateAPIView.as_view())(request).status_code, 401)
+
+    @skipUnless(httpx, "httpx is not installed")
+    def test_client_errors_are_not_retried(self):
+        # e.g. rotated API keys: a 401 is our problem, not a gateway outage
+        calls = []
+        transport = httpx.MockTransport(lambda request: calls.append(request) or httpx.Response(401, text='Unauthorized'))
+        gateway = get_gateway()
+        client = httpx.AsyncClient(base_url=gateway.base_url, transport=transport)
+        with mock.patch.object(gateway, '_async_client', return_value=client):
+            with self.assertRaises(razorpay.errors.BadRequestError):
+                async_to_sync(gateway.acreate_order)(amount=1000, receipt='r-1')
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(gateway.breaker.allow())
+
+    def test_slow_gateway_times_out(self):
+        self.gateway_server.latency = 1.0  # READ_TIMEOUT is 0.5
+        with self.assertRaises(GatewayUnavailable):
+            async_to_sync(get_gateway().acreate_order)(amount=1000, receipt='r-1')
+
+    def test_catalog_cache_and_etag(self):
+        make_product(1)
+        view = async_to_sync(AsyncProductListCreateAPIView.as_view())
+        first = view(self.factory.get('/api/products/'))
+        self.assertEqual(first.data, self.client.get('/api/products/').json())
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = view(self.factory.get('/api/products/'))
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(second.data, first.data)
+
+        not_modified = view(self.factory.get('/api/products/', HTTP_IF_NONE_MATCH=first['ETag']))
+        self.assertEqual(not_modified.status_code, 304)
+
+
+# --- API COMPRESSION ---
+class APICompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for n in range(10):
+            make_product(n)
+
+    def test_gzips_large_api_responses(self):
+        plain = self.client.get('/api/products/')
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content) / 2)
+
+    @mock.patch('bari_app.middleware.brotli', None)
+    def test_small_and_unaccepted_responses_are_left_alone(self):
+        with override_settings(API_COMPRESSION={**settings.API_COMPRESSION, 'MIN_SIZE': 10**6}):
+            response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        for header in ('', 'identity', 'gzip;q=0', 'br'):
+            response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING=header)
+            self.assertFalse(response.has_header('Content-Encoding'), header)
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_negotiation(self):
+        self.assertEqual(accepted_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(accepted_encoding('*'), 'br' if brotli else 'gzip')
+        self.assertEqual(accepted_encoding('br;q=0.5, gzip;q=0.8'), 'gzip')
+        self.assertEqual(accepted_encoding('*;q=0, gzip;q=0'), None)
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli_preferred(self):
+        plain = self.client.get('/api/products/')
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_compressed_etag_still_matches(self):
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_streaming_responses(self):
+        chunks = [b'{"rows": [', *(b'{"image": "https://barifoods.in/media/products/a.jpg"},' for _ in range(50)), b'{}]}']
+        request = RequestFactory().get('/api/export/', HTTP_ACCEPT_ENCODING='gzip')
+
+        def stream(request):
+            return StreamingHttpResponse(iter(chunks), content_type='application/json')
+
+        response = APICompressionMiddleware(stream)(request)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(chunks))
+
+        async def astream(request):
+            async def body():
+                for chunk in chunks:
+                    yield chunk
+            return StreamingHttpResponse(body(), content_type='application/json')
+
+        async def collect():
+            response = await APICompressionMiddleware(astream)(request)
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        self.assertEqual(gzip.decompress(async_to_sync(collect)()), b''.join(chunks))
+
+    def test_non_api_paths_are_left_alone(self):
+        request = RequestFactory().get('/admin/', HTTP_ACCEPT_ENCODING='gzip')
+        response = APICompressionMiddleware(lambda request: HttpResponse(b'x' * 5000))(request)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+# --- REQUEST INSTRUMENTATION ---
+class RequestInstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_product(1)
+
+    def test_server_timing_counts_queries(self):
+        with CaptureQueriesContext(connection) as ctx, self.assertLogs('bari.requests', 'INFO') as logs:
+            response = self.client.get('/api/products/')
+
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+$')
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing)
+        self.assertIn(f'queries={len(ctx.captured_queries)} ', logs.output[0])
+        self.assertIn('path=/api/products/ view=product-list status=200', logs.output[0])
+
+    def test_slow_requests_log_their_sql(self):
+        options = {**settings.REQUEST_INSTRUMENTATION, 'SLOW_REQUEST_MS': 0, 'SLOW_REQUEST_SQL': 2}
+        with override_settings(REQUEST_INSTRUMENTATION=options), self.assertLogs('bari.requests', 'WARNING') as logs:
+            self.client.get('/api/products/')
+
+        record = logs.records[0].getMessage()
+        self.assertTrue(record.startswith('slow_request=1 '))
+        self.assertEqual(record.count(' ms  SELECT'), 2)
+        self.assertIn('bari_app_product', record)
+
+    def test_header_can_be_turned_off(self):
+        options = {**settings.REQUEST_INSTRUMENTATION, 'SERVER_TIMING': False}
+        with override_settings(REQUEST_INSTRUMENTATION=options):
+            self.assertFalse(self.client.get('/api/products/').has_header('Server-Timing'))
+
+
+# --- METRICS ---
+@skipUnless(prometheus_client, "prometheus_client is not installed")
+@override_settings(METRICS_TOKEN='scrape-me')
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sample(self, name, **labels):
+        return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_labelled_by_view(self):
+        labels = {'view': 'ProductListCreateAPIView', 'method': 'GET', 'status': '200'}
+        before = self.sample('bari_http_requests_total', **labels)
+        self.client.get('/api/products/')
+
+        self.assertEqual(self.sample('bari_http_requests_total', **labels), before + 1)
+        body = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me').content.decode()
+        self.assertIn('bari_http_request_duration_seconds_bucket{le="0.005",method="GET",status="200",'
+                      'view="ProductListCreateAPIView"}', body)
+        self.assertIn('bari_db_queries_per_request_count{view="ProductListCreateAPIView"}', body)
+
+    def test_checkout_outcomes(self):
+        labels = {'step': 'checkout', 'outcome': 'rejected'}
+        before = self.sample('bari_checkout_outcomes_total', **labels)
+        self.client.post('/api/checkout/', {}, format='json', HTTP_IDEMPOTENCY_KEY='empty-cart-1')
+        self.client.post('/api/checkout/', {}, format='json', HTTP_IDEMPOTENCY_KEY='empty-cart-1')  # replayed
+        self.assertEqual(self.sample('bari_checkout_outcomes_total', **labels), before + 1)
+
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version='))
+
+    @override_settings(METRICS_TOKEN='')
+    def test_off_without_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+
+# --- HEALTH CHECKS ---
+class HealthCheckTests(FakeGatewayMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root, HEALTH_CHECK_CACHE_SECONDS=60)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_liveness(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/healthz')
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_readiness_is_cached(self):
+        with self.assertNumQueries(1):
+            first = self.client.get('/readyz')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['status'], 'ok')
+        self.assertEqual(set(first.json()['checks']), {'database', 'cache', 'media', 'gateway'})
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/readyz')
+        self.assertEqual(second.json()['checks'], first.json()['checks'])
+
+    def test_gateway_outage_only_degrades(self):
+        with override_settings(PAYMENT_GATEWAY={**settings.PAYMENT_GATEWAY, 'BASE_URL': 'http://127.0.0.1:9'}), \
+                self.assertLogs('bari_project.health', 'WARNING'):
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'degraded')
+        self.assertFalse(response.json()['checks']['gateway']['ok'])
+
+    def test_unwritable_media_fails(self):
+        with override_settings(MEDIA_ROOT='/nonexistent/media', HEALTH_CHECK_CACHE_SECONDS=0), \
+                self.assertLogs('bari_project.health', 'WARNING'):
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'fail')
+        self.assertEqual(response.json()['checks']['media'], {'ok': False, 'error': 'FileNotFoundError', 'ms': mock.ANY})
@@ -0,0 +1,50 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+# --- TOKEN BUCKETS ---
+# A bucket holds up to `capacity` tokens and refills at capacity/period per second; each attempt
+# takes one. Unlike a fixed window this allows a short burst (a user retyping a password) but
+# caps the sustained rate, which is what bounds password-hashing CPU under credential stuffing.
+# Callers check wait_time() up front and spend() only on a failure, so legitimate traffic never drains them.
+# State lives in the shared cache as (tokens, timestamp). Read-modify-write isn't atomic, so a
+# burst of exactly simultaneous requests may overspend by a token or two - fine for a throttle.
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60), the same notation DRF throttles use."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class TokenBucket:
+    def __init__(self, scope, rate):
+        self.scope = scope
+        self.capacity, self.period = parse_rate(rate)
+
+    def key(self, ident):
+        # Hash the identifier: usernames can contain characters some cache backends reject in keys
+        return f'bucket:{self.scope}:{hashlib.sha256(str(ident).encode()).hexdigest()[:32]}'
+
+    def state(self, ident, now):
+        tokens, updated = cache.get(self.key(ident), (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.capacity / self.period)
+
+    def wait(self, tokens):
+        return 0 if tokens >= 1 else (1 - tokens) * self.period / self.capacity
+
+
+def wait_time(*checks):
+    """Seconds until every (bucket, ident) pair has a token again; 0 if they all have one now."""
+    now = time.time()
+    return max((bucket.wait(bucket.state(ident, now)) for bucket, ident in checks), default=0)
+
+
+def spend(*checks):
+    """Take one token from each (bucket, ident) pair."""
+    now = time.time()
+    for bucket, ident in checks:
+        cache.set(bucket.key(ident), (bucket.state(ident, now) - 1, now), bucket.period)
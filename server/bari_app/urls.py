@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from .views import (
@@ -7,9 +8,12 @@ from .views import (
     UserLoginAPIView, 
     UserProfileAPIView, 
     CartAPIView, 
+    CartSummaryAPIView,
     CartItemDetailAPIView,
     CheckoutAPIView,
     OrderListAPIView, 
+    OrderDetailAPIView,
+    LatestOrderAPIView,
     AddressListCreateAPIView,
     AddressDetailAPIView, 
     FeaturedProductListAPIView,
@@ -18,6 +22,15 @@ from .views import (
     RazorpayPaymentVerifyAPIView
 )
 
+if settings.ASYNC_VIEWS:
+    # ASGI deployments: same endpoints and responses, served by async views
+    from .async_views import (
+        AsyncProductListCreateAPIView as ProductListCreateAPIView,
+        AsyncProductDetailAPIView as ProductDetailAPIView,
+        AsyncFeaturedProductListAPIView as FeaturedProductListAPIView,
+        AsyncRazorpayOrderCreateAPIView as RazorpayOrderCreateAPIView,
+    )
+
 urlpatterns = [
 
     path('products/', ProductListCreateAPIView.as_view(), name='product-list'),
@@ -31,11 +44,14 @@ urlpatterns = [
     
     # Cart APIs
     path('cart/', CartAPIView.as_view(), name='cart-detail'),
+    path('cart/summary/', CartSummaryAPIView.as_view(), name='cart-summary'),
     path('cart/<int:item_id>/', CartItemDetailAPIView.as_view(), name='cart-item-detail'),
     
     # Order APIs
     path('checkout/', CheckoutAPIView.as_view(), name='checkout'), # For COD
     path('orders/', OrderListAPIView.as_view(), name='order-list'),
+    path('orders/latest/', LatestOrderAPIView.as_view(), name='order-latest'),
+    path('orders/<int:pk>/', OrderDetailAPIView.as_view(), name='order-detail'),
     
     # Address APIs
     path('addresses/', AddressListCreateAPIView.as_view(), name='address-list'),
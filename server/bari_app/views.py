@@ -1,14 +1,16 @@
 from django.shortcuts import render
-from rest_framework import generics, status
+from django.http import Http404
+from rest_framework import generics, status, filters
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, SAFE_METHODS
 from rest_framework.decorators import api_view, permission_classes
-from django.db.models import Q
+from django.db.models import Q, Prefetch, Sum
+from django.db.models.functions import Coalesce
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from django.db import transaction # Needed for atomic transactions
 from django.conf import settings # <--- ADDED: To access RAZORPAY_KEY_ID
+from django.core.cache import cache
 import razorpay # <--- ADDED: Razorpay library
 
 # Import all models
@@ -21,26 +23,68 @@ from .serializers import (
     UserLoginSerializer, 
     UserProfileSerializer,
     CartItemSerializer,
+    CartBatchSerializer,
     OrderSerializer,
     AddressSerializer,
-    FeaturedProductSerializer
+    FeaturedProductSerializer,
+    ProductFilterSerializer,
+    OrderSummarySerializer
 )
-from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from .pagination import ProductCursorPagination, OrderCursorPagination
+from .catalog_cache import CatalogCacheMixin
+from .services import place_order, EmptyCartError, UnknownProductError
+from .cart_store import (
+    get_cart_store, cart_totals, guest_carts, CartBusy, merge_guest_cart, new_guest_token, read_guest_token, GUEST_CART_HEADER,
+)
+from .inventory import reserve_cart_stock, release_user_reservations, OutOfStockError
+from .idempotency import idempotent
+from .payments import get_gateway, GatewayUnavailable
+from django.contrib.auth.models import User
+from .authentication import tokens_for_user, verify_credentials
+from .signals import profile_cache_key
+from bari_project.metrics import counts_outcome
 
 # --- PRODUCT VIEWS ---
-class ProductListCreateAPIView(generics.ListCreateAPIView):
-    queryset = Product.objects.all()
+class ProductListCreateAPIView(CatalogCacheMixin, generics.ListCreateAPIView):
+    queryset = Product.objects.catalog()
     serializer_class = ProductSerializer
     permission_classes = [AllowAny] 
+    pagination_class = ProductCursorPagination
+
+    # Sorting: ?ordering=price | -price | -rating | -created_at (newest, the default)
+    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['name', 'description', 'tag']
+    ordering_fields = ['price', 'rating', 'created_at']
+    ordering = ['-created_at', '-id']  # id breaks ties (see pagination.py)
 
-class ProductDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.all()
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+
+        params = ProductFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        if data.get('tag'):
+            queryset = queryset.filter(tag__iexact=data['tag'])
+        if 'min_price' in data:
+            queryset = queryset.filter(price__gte=data['min_price'])
+        if 'max_price' in data:
+            queryset = queryset.filter(price__lte=data['max_price'])
+        if data.get('in_stock') is not None:
+            queryset = queryset.filter(stock__gt=0) if data['in_stock'] else queryset.filter(stock__lte=0)
+        if 'ids' in data:
+            queryset = queryset.filter(id__in=data['ids'])
+        return queryset
+
+class ProductDetailAPIView(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Product.objects.catalog()
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
 
-class FeaturedProductListAPIView(generics.ListAPIView):
-    queryset = FeaturedProduct.objects.filter(is_active=True)
+class FeaturedProductListAPIView(CatalogCacheMixin, generics.ListAPIView):
+    queryset = FeaturedProduct.objects.filter(is_active=True).select_related('product').prefetch_related('product__images')
     serializer_class = FeaturedProductSerializer
     permission_classes = [AllowAny]
 
@@ -59,12 +103,18 @@ class UserLoginAPIView(APIView):
         if serializer.is_valid():
             username = serializer.validated_data['username']
             password = serializer.validated_data['password']
-            user = authenticate(username=username, password=password)
+            user = verify_credentials(request, username, password)  # rate limited, see authentication.py
             
             if user:
-                refresh = RefreshToken.for_user(user)
-                profile, created = UserProfile.objects.get_or_create(user=user)
-                
+                # Bring along whatever the visitor put in their cart before signing in
+                guest_cart_id = read_guest_token(request.headers.get(GUEST_CART_HEADER))
+                if guest_cart_id:
+                    merge_guest_cart(user, guest_cart_id)
+
+                refresh = tokens_for_user(user)
+                # Already loaded by ProfileModelBackend; a missing profile is only created when the user saves one
+                profile = getattr(user, 'userprofile', None)
+
                 return Response({
                     'refresh': str(refresh),
                     'access': str(refresh.access_token),
@@ -84,100 +134,194 @@ class UserProfileAPIView(generics.RetrieveUpdateAPIView):
     serializer_class = UserProfileSerializer
 
     def get_object(self):
-        obj, created = UserProfile.objects.get_or_create(user=self.request.user)
+        # user_id, not user: on reads request.user is built from token claims (authentication.py)
+        user_id = self.request.user.id
+        if self.request.method in SAFE_METHODS:
+            # No row yet: show an empty profile rather than creating one on a read
+            profile = UserProfile.objects.select_related('user').filter(user_id=user_id).first()
+            return profile or UserProfile(user=User.objects.get(id=user_id))
+        obj, created = UserProfile.objects.select_related('user').get_or_create(user_id=user_id)
         return obj
 
-# --- CART VIEWS ---
-class CartAPIView(APIView):
-    permission_classes = [IsAuthenticated]
+    def retrieve(self, request, *args, **kwargs):
+        # Profile reads come from a short-lived cache entry; signals.py drops it when User/UserProfile change
+        key = profile_cache_key(request.user.id)
+        data = cache.get(key)
+        if data is None:
+            data = self.get_serializer(self.get_object()).data
+            cache.set(key, data, settings.PROFILE_CACHE_TTL)
+        return Response(data)
 
+# --- CART VIEWS ---
+# Reads and writes go through the configured cart store (cart_store.py, settings.CART_STORE).
+# Signed-out visitors get a guest cart named by the X-Cart-Token header instead.
+class CartOwnerMixin:
+    permission_classes = [AllowAny]
+    guest_token = None
+
+    def cart(self, create=False):
+        """(store, owner): the user's cart store and user, or the guest store and guest cart id."""
+        if self.request.user.is_authenticated:
+            return get_cart_store(), self.request.user
+        token = self.request.headers.get(GUEST_CART_HEADER)
+        cart_id = read_guest_token(token)
+        if cart_id is None and create:
+            token = new_guest_token()
+            cart_id = read_guest_token(token)
+        if cart_id is not None:
+            self.guest_token = token
+        return guest_carts, cart_id
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Hand the (possibly new) guest token back so the client can keep sending it
+        if self.guest_token:
+            response[GUEST_CART_HEADER] = self.guest_token
+            if isinstance(response.data, dict):
+                response.data['cart_token'] = self.guest_token
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class CartAPIView(CartOwnerMixin, APIView):
     def get(self, request):
-        cart_items = CartItem.objects.filter(user=request.user)
-        serializer = CartItemSerializer(cart_items, many=True)
-        return Response(serializer.data)
+        store, owner = self.cart()
+        return Response(store.items(owner))
+
+    def patch(self, request):
+        """Batch edit: apply add/set/remove operations in one go and return the updated cart with totals."""
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        store, owner = self.cart(create=True)
+        try:
+            store.apply(owner, serializer.validated_data['operations'])
+        except UnknownProductError as e:
+            return Response({'error': 'Product not found', 'product_ids': e.product_ids}, status=status.HTTP_404_NOT_FOUND)
+
+        items = store.items(owner)
+        return Response({'items': items, **cart_totals(items)})
 
     def post(self, request):
         product_id = request.data.get('product_id')
-        quantity = int(request.data.get('quantity', 1))
+        try:
+            product_id = int(product_id)
+            quantity = int(request.data.get('quantity', 1))
+        except (TypeError, ValueError):
+            return Response({'error': 'product_id and quantity must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity < 1:
+            return Response({'error': 'Quantity must be at least 1'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            product = Product.objects.get(id=product_id)
-            cart_item, created = CartItem.objects.get_or_create(
-                user=request.user, 
-                product=product
-            )
-            if not created:
-                cart_item.quantity += quantity
-            else:
-                cart_item.quantity = quantity
-            cart_item.save()
+            store, owner = self.cart(create=True)
+            store.add(owner, product_id, quantity)
             return Response({'message': 'Item added to cart'}, status=status.HTTP_200_OK)
         except Product.DoesNotExist:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
 
+class CartSummaryAPIView(CartOwnerMixin, APIView):
+    """Just {item_count, subtotal} for the header badge - cheap enough to call on every page."""
+
+    def get(self, request):
+        store, owner = self.cart()
+        return Response(store.summary(owner))
+
 class CartItemDetailAPIView(APIView):
+    """Edits a CartItem row by id, so a cache-backed cart is written back first and reloaded after."""
     permission_classes = [IsAuthenticated]
 
     def put(self, request, item_id):
-        try:
-            cart_item = CartItem.objects.get(id=item_id, user=request.user)
-            quantity = request.data.get('quantity')
-            
-            if quantity is not None:
-                cart_item.quantity = int(quantity)
-                cart_item.save()
-                return Response(CartItemSerializer(cart_item).data, status=status.HTTP_200_OK)
-            
-            return Response({'error': 'Quantity is required'}, status=status.HTTP_400_BAD_REQUEST)
-        except CartItem.DoesNotExist:
-            return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
+        with get_cart_store().direct_writes(request.user):
+            try:
+                cart_item = CartItem.objects.get(id=item_id, user=request.user)
+                quantity = request.data.get('quantity')
+
+                if quantity is not None:
+                    cart_item.quantity = int(quantity)
+                    cart_item.save()
+                    return Response(CartItemSerializer(cart_item).data, status=status.HTTP_200_OK)
+
+                return Response({'error': 'Quantity is required'}, status=status.HTTP_400_BAD_REQUEST)
+            except CartItem.DoesNotExist:
+                return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
 
     def delete(self, request, item_id):
-        try:
-            cart_item = CartItem.objects.get(id=item_id, user=request.user)
-            cart_item.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        except CartItem.DoesNotExist:
-            return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
+        with get_cart_store().direct_writes(request.user):
+            try:
+                cart_item = CartItem.objects.get(id=item_id, user=request.user)
+                cart_item.delete()
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            except CartItem.DoesNotExist:
+                return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
 
 # --- ORDER VIEWS (STANDARD COD) ---
+def order_detail_queryset(user):
+    # Everything OrderSerializer nests: orders, items joined to products, then gallery images - 3 queries
+    return Order.objects.filter(user=user).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product')),
+        'items__product__images',
+    )
+
 class OrderListAPIView(generics.ListAPIView):
+    """Paginated order history. ?view=summary returns headers only; full detail is at /api/orders/<id>/."""
+    permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
+
+    def is_summary(self):
+        return self.request.query_params.get('view') == 'summary'
+
+    def get_serializer_class(self):
+        return OrderSummarySerializer if self.is_summary() else OrderSerializer
+
+    def get_queryset(self):
+        if self.is_summary():
+            return Order.objects.filter(user=self.request.user).annotate(
+                item_count=Coalesce(Sum('items__quantity'), 0)
+            )
+        return order_detail_queryset(self.request.user)
+
+class OrderDetailAPIView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderSerializer
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        return order_detail_queryset(self.request.user)
+
+class LatestOrderAPIView(OrderDetailAPIView):
+    """The user's most recent order (used by the order confirmation page)."""
+
+    def get_object(self):
+        order = self.get_queryset().order_by('-created_at').first()
+        if order is None:
+            raise Http404("No orders yet")
+        return order
+
+def order_from_cart(user, payment_method, allow_oversell=False):
+    # place_order reads and empties CartItem: flush a cache-backed cart first and drop it afterwards,
+    # with adds from other tabs waiting until then (cart_store.direct_writes)
+    with get_cart_store().direct_writes(user):
+        return place_order(user, payment_method=payment_method, allow_oversell=allow_oversell)
+
+def placed_order_response(request, order, message):
+    # Return the full order so the confirmation page can render without fetching it again
+    order = order_detail_queryset(request.user).get(id=order.id)
+    return Response({
+        'message': message,
+        'order_id': order.id,
+        'order': OrderSerializer(order, context={'request': request}).data,
+    }, status=status.HTTP_201_CREATED)
 
 class CheckoutAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
+    @counts_outcome('checkout')
     def post(self, request):
-        cart_items = CartItem.objects.filter(user=request.user)
-        if not cart_items.exists():
-            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
-
-        total_price = sum(item.product.price * item.quantity for item in cart_items)
         payment_method = request.data.get('payment_method', 'cod')
+        try:
+            order = order_from_cart(request.user, payment_method)
+        except EmptyCartError:
+            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+        except OutOfStockError as e:
+            return Response({'error': str(e), 'out_of_stock': e.products}, status=status.HTTP_409_CONFLICT)
 
-        with transaction.atomic():
-            order = Order.objects.create(
-                user=request.user,
-                total_price=total_price,
-                status='Pending',
-                payment_method=payment_method
-            )
-
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                    price_at_purchase=item.product.price
-                )
-            
-            cart_items.delete()
-
-        return Response({'message': 'Order placed successfully', 'order_id': order.id}, status=status.HTTP_201_CREATED)
+        return placed_order_response(request, order, 'Order placed successfully')
 
 # --- ADDRESS VIEWS ---
 class AddressListCreateAPIView(generics.ListCreateAPIView):
@@ -206,41 +350,71 @@ class AddressDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
 class RazorpayOrderCreateAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @counts_outcome('payment_create')
     def post(self, request):
-        cart_items = CartItem.objects.filter(user=request.user)
-        if not cart_items.exists():
+        try:
+            amount, receipt = reserve_payment(request.user)
+        except EmptyCartError:
             return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Calculate Total
-        total_price = sum(item.product.price * item.quantity for item in cart_items)
-        
-        # Initialize Razorpay Client
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-        
-        # Create Order (Amount must be in Paise: 100 INR = 10000 Paise)
-        data = {
-            "amount": int(total_price * 100),
-            "currency": "INR",
-            "receipt": f"order_rcptid_{request.user.id}",
-            "payment_capture": 1
-        }
-        razorpay_order = client.order.create(data=data)
-        
-        return Response({
-            'order_id': razorpay_order['id'],
-            'amount': razorpay_order['amount'],
-            'key': settings.RAZORPAY_KEY_ID,
-            'user_email': request.user.email,
-            'user_phone': request.user.userprofile.phone if hasattr(request.user, 'userprofile') else ""
-        })
+        except OutOfStockError as e:
+            return Response({'error': str(e), 'out_of_stock': e.products}, status=status.HTTP_409_CONFLICT)
+
+        # Create Order on the shared, pooled gateway client
+        try:
+            razorpay_order = get_gateway().create_order(amount=amount, receipt=receipt)
+        except GatewayUnavailable as e:
+            release_user_reservations(request.user)
+            return gateway_unavailable_response(e)
+        except Exception:
+            release_user_reservations(request.user)
+            raise
+
+        return Response(payment_order_payload(request.user, razorpay_order))
+
+
+def reserve_payment(user):
+    """
+    Persist the user's cart and hold its stock ahead of a gateway order.
+    Returns (amount in paise, receipt); raises EmptyCartError or OutOfStockError.
+    """
+    get_cart_store().persist(user)
+    cart_items = list(CartItem.objects.filter(user=user).select_related('product'))
+    if not cart_items:
+        raise EmptyCartError()
+
+    # Calculate Total (Amount must be in Paise: 100 INR = 10000 Paise)
+    total_price = sum(item.product.price * item.quantity for item in cart_items)
+    receipt = f"order_rcptid_{user.id}"
+
+    # Hold the stock before talking to the gateway, so sold-out items fail fast
+    reserve_cart_stock(user, cart_items, reference=receipt)
+    return int(total_price * 100), receipt
+
+
+def gateway_unavailable_response(error):
+    headers = {'Retry-After': str(error.retry_after)} if error.retry_after else {}
+    return Response({'error': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers=headers)
+
+
+def payment_order_payload(user, razorpay_order, phone=None):
+    if phone is None:
+        phone = user.userprofile.phone if hasattr(user, 'userprofile') else ""
+    return {
+        'order_id': razorpay_order['id'],
+        'amount': razorpay_order['amount'],
+        'key': settings.RAZORPAY_KEY_ID,
+        'user_email': user.email,
+        'user_phone': phone,
+    }
 
 # 2. Verify Payment (Create Local Order after Success)
 class RazorpayPaymentVerifyAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
+    @counts_outcome('payment_verify')
     def post(self, request):
         data = request.data
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
 
         try:
             # Verify the signature
@@ -249,39 +423,21 @@ class RazorpayPaymentVerifyAPIView(APIView):
                 'razorpay_payment_id': data.get('razorpay_payment_id'),
                 'razorpay_signature': data.get('razorpay_signature')
             }
-            client.utility.verify_payment_signature(params_dict)
+            get_gateway().verify_payment_signature(params_dict)
 
             # --- SIGNATURE VALID: Create Order in Database ---
-            with transaction.atomic():
-                cart_items = CartItem.objects.filter(user=request.user)
-                if not cart_items.exists():
-                     return Response({'error': 'Cart empty or already processed'}, status=400)
-
-                total_price = sum(item.product.price * item.quantity for item in cart_items)
-
-                # Create Order
-                order = Order.objects.create(
-                    user=request.user,
-                    total_price=total_price,
-                    status='Pending',
-                    payment_method='razorpay' # Mark as Razorpay
-                )
-
-                # Move items
-                for item in cart_items:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=item.product,
-                        quantity=item.quantity,
-                        price_at_purchase=item.product.price
-                    )
-                
-                # Clear Cart
-                cart_items.delete()
-
-            return Response({'message': 'Payment Successful', 'order_id': order.id}, status=status.HTTP_201_CREATED)
+            # The payment is already captured, so the order is placed even if the stock hold expired
+            # before verification; an oversell is logged for restocking or a refund (inventory.py)
+            try:
+                order = order_from_cart(request.user, 'razorpay', allow_oversell=True) # Mark as Razorpay
+            except EmptyCartError:
+                return Response({'error': 'Cart empty or already processed'}, status=400)
+
+            return placed_order_response(request, order, 'Payment Successful')
 
         except razorpay.errors.SignatureVerificationError:
             return Response({'error': 'Payment verification failed'}, status=status.HTTP_400_BAD_REQUEST)
+        except CartBusy:
+            raise  # 503 + Retry-After: the client retries with the same Idempotency-Key
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
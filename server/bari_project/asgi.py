@@ -12,5 +12,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bari_project.settings')
+# Under ASGI the I/O-bound endpoints use their async views (see bari_app/async_views.py)
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+# Sync work runs on a fresh thread per request under ASGI, and a persistent connection is only closed
+# once it is older than CONN_MAX_AGE, so each request would leave one open. Django's advice for async
+# mode is to disable persistent connections; this overrides DB_CONN_MAX_AGE from .env.
+os.environ['DB_CONN_MAX_AGE'] = '0'
 
 application = get_asgi_application()
@@ -0,0 +1,102 @@
+import logging
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# --- HEALTH CHECKS ---
+# /healthz (liveness) answers from the process alone: if it responds, the worker is alive, and a
+# dependency outage must not get every worker restarted. /readyz (readiness) runs the checks below.
+# A failed critical check makes it answer 503 so the load balancer stops routing to this instance.
+# The payment gateway is reported but not critical: browsing and COD still work while it is down.
+# Results are kept per process for HEALTH_CHECK_CACHE_SECONDS, so frequent probes from several
+# balancers cost one round of checks per worker every few seconds.
+
+
+def check_database():
+    for alias in connections:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+def check_cache():
+    key, value = f'healthcheck:{uuid.uuid4().hex}', uuid.uuid4().hex
+    cache.set(key, value, 10)
+    try:
+        if cache.get(key) != value:
+            raise RuntimeError("cache did not return the value just written")
+    finally:
+        cache.delete(key)
+
+
+def check_media():
+    with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT, prefix='.healthcheck-'):
+        pass
+
+
+def check_gateway():
+    from bari_app.payments import get_gateway
+
+    gateway = get_gateway()
+    if gateway.breaker.retry_after():
+        raise RuntimeError("circuit breaker is open")
+    gateway.ping(timeout=settings.HEALTH_CHECK_GATEWAY_TIMEOUT)
+
+
+# name -> (check, critical)
+CHECKS = {
+    'database': (check_database, True),
+    'cache': (check_cache, True),
+    'media': (check_media, True),
+    'gateway': (check_gateway, False),
+}
+
+_lock = threading.Lock()
+_last = None  # (monotonic time, report)
+
+
+def run_checks():
+    results, healthy, degraded = {}, True, False
+    for name, (check, critical) in CHECKS.items():
+        started = time.perf_counter()
+        try:
+            check()
+        except Exception as e:
+            # Details go to the log, not to whoever is probing
+            logger.warning("Readiness check %s failed: %s: %s", name, type(e).__name__, e)
+            results[name] = {'ok': False, 'error': type(e).__name__}
+            healthy = healthy and not critical
+            degraded = True
+        else:
+            results[name] = {'ok': True}
+        results[name]['ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    status = 'ok' if not degraded else 'degraded' if healthy else 'fail'
+    return {'status': status, 'checks': results}
+
+
+def readiness():
+    """The latest readiness report, re-run at most every HEALTH_CHECK_CACHE_SECONDS. Adds its age in seconds."""
+    global _last
+    with _lock:  # concurrent probes wait for one run instead of each running the checks
+        now = time.monotonic()
+        if _last is None or now - _last[0] >= settings.HEALTH_CHECK_CACHE_SECONDS:
+            _last = (now, run_checks())
+        checked_at, report = _last
+    return {**report, 'age': round(now - checked_at, 1)}
+
+
+@receiver(setting_changed)
+def reset_readiness(setting=None, **kwargs):
+    global _last
+    if setting in (None, 'HEALTH_CHECK_CACHE_SECONDS', 'HEALTH_CHECK_GATEWAY_TIMEOUT', 'PAYMENT_GATEWAY'):
+        with _lock:
+            _last = None
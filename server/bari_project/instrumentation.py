@@ -0,0 +1,151 @@
+import contextvars
+import heapq
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.encoding import escape_uri_path
+
+from . import metrics
+
+logger = logging.getLogger('bari.requests')
+
+# --- REQUEST INSTRUMENTATION ---
+# RequestTimingMiddleware measures every request: wall time, ORM query count and DB time (through a
+# connection execute wrapper), and DRF render time. They go out as a Server-Timing header, which
+# browser dev tools show per request, as one logfmt line per request on the 'bari.requests'
+# logger, and into the Prometheus histograms in metrics.py. Requests slower than SLOW_REQUEST_MS
+# are logged as warnings along with the SQL of their slowest queries. Cheap enough to leave on:
+# per query it is two clock reads and a heap push.
+# Settings live in settings.REQUEST_INSTRUMENTATION.
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db_time', 'render_started', 'render_time', 'slowest', 'keep')
+
+    def __init__(self, keep):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+        self.slowest = []  # min-heap of (seconds, n, sql): the `keep` slowest queries
+        self.keep = keep
+
+    def record_query(self, sql, seconds):
+        self.queries += 1
+        self.db_time += seconds
+        entry = (seconds, self.queries, sql)
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, entry)
+        elif self.slowest and seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+def current_stats():
+    """The RequestStats of the request being served, or None outside one."""
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_hook(connection):
+    # Installed once per connection rather than with `with connection.execute_wrapper()` per
+    # request, so queries from sync_to_async threads (async views) are counted too
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def _hook_new_connection(sender, connection, **kwargs):
+    install_query_hook(connection)
+
+
+class RequestTimingMiddleware:
+    """Per-request wall time, query count, DB time and render time: Server-Timing header and log line."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Connections this thread opened before the signal receiver above was connected
+        for connection in connections.all():
+            install_query_hook(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _current.set(RequestStats(settings.REQUEST_INSTRUMENTATION['SLOW_REQUEST_SQL']))
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response, _current.get())
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        token = _current.set(RequestStats(settings.REQUEST_INSTRUMENTATION['SLOW_REQUEST_SQL']))
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response, _current.get())
+        finally:
+            _current.reset(token)
+
+    def process_template_response(self, request, response):
+        # Called just before a DRF Response is rendered; the callback runs just after
+        stats = _current.get()
+        if stats is not None:
+            stats.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: self.rendered(stats))
+        return response
+
+    def rendered(self, stats):
+        stats.render_time += time.perf_counter() - stats.render_started
+
+    def finish(self, request, response, stats):
+        options = settings.REQUEST_INSTRUMENTATION
+        total = time.perf_counter() - stats.started
+        metrics.observe_request(request, response.status_code, total, stats.queries, stats.db_time)
+        total_ms = total * 1000
+        db_ms = stats.db_time * 1000
+        render_ms = stats.render_time * 1000
+
+        if options['SERVER_TIMING']:
+            timing = (
+                f'total;dur={total_ms:.1f}, db;dur={db_ms:.1f};desc="{stats.queries} queries", '
+                f'render;dur={render_ms:.1f}'
+            )
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+
+        match = request.resolver_match
+        line = (
+            f'method={request.method} path={escape_uri_path(request.path)} view={match.view_name if match else "-"} '
+            f'status={response.status_code} duration_ms={total_ms:.1f} queries={stats.queries} '
+            f'db_ms={db_ms:.1f} render_ms={render_ms:.1f}'
+        )
+        if total_ms >= options['SLOW_REQUEST_MS']:
+            slowest = sorted(stats.slowest, reverse=True)
+            sql = ''.join(f'\n  {seconds * 1000:.1f} ms  {query}' for seconds, _, query in slowest)
+            logger.warning('slow_request=1 %s%s', line, sql)
+        elif request.path not in options['QUIET_PATHS']:
+            logger.info(line)
+        return response
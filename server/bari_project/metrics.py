@@ -0,0 +1,120 @@
+import functools
+import os
+
+from asgiref.sync import iscoroutinefunction
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram, multiprocess
+except ImportError:  # optional: without it nothing is recorded and /metrics answers 503
+    prometheus_client = None
+
+# --- METRICS ---
+# Prometheus metrics, exposed at /metrics in the text exposition format (bari_project/views.py).
+# Request latency, counts and DB load are fed by RequestTimingMiddleware (instrumentation.py), labelled
+# by view class (URL name for plain function views) and status. Checkout and payment outcomes are
+# counted by the @counts_outcome views in bari_app.
+# gunicorn workers are separate processes, so gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a
+# shared directory: each worker writes its metrics to mmap'd files there and a scrape sums them all.
+# Set it yourself for other multi-process servers (uvicorn --workers).
+
+KNOWN_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+if prometheus_client:
+    REQUESTS = Counter(
+        'bari_http_requests', "HTTP requests served.", ['view', 'method', 'status'],
+    )
+    REQUEST_LATENCY = Histogram(
+        'bari_http_request_duration_seconds', "Time from the first middleware in to the response out.",
+        ['view', 'method', 'status'],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    )
+    DB_QUERIES = Histogram(
+        'bari_db_queries_per_request', "ORM queries run by one request.", ['view'],
+        buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+    )
+    DB_TIME = Histogram(
+        'bari_db_time_seconds', "Time one request spent waiting on the database.", ['view'],
+        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+    )
+    CHECKOUT_OUTCOMES = Counter(
+        'bari_checkout_outcomes', "Checkout and payment attempts by step and outcome.", ['step', 'outcome'],
+    )
+
+
+def view_label(request):
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'  # 404s: keep arbitrary paths out of the label values
+    view_class = getattr(match.func, 'view_class', None)
+    if view_class is not None:
+        return view_class.__name__
+    return match.view_name or match.func.__name__
+
+
+def observe_request(request, status, seconds, queries, db_seconds):
+    if prometheus_client is None:
+        return
+    view = view_label(request)
+    method = request.method if request.method in KNOWN_METHODS else 'OTHER'
+    REQUESTS.labels(view, method, status).inc()
+    REQUEST_LATENCY.labels(view, method, status).observe(seconds)
+    DB_QUERIES.labels(view).observe(queries)
+    DB_TIME.labels(view).observe(db_seconds)
+
+
+def outcome_for(status):
+    if status < 300:
+        return 'success'
+    if status == 409:
+        return 'out_of_stock'
+    if status == 503:
+        return 'gateway_unavailable'
+    if status < 500:
+        return 'rejected'
+    return 'error'
+
+
+def record_outcome(step, outcome):
+    if prometheus_client is not None:
+        CHECKOUT_OUTCOMES.labels(step, outcome).inc()
+
+
+def counts_outcome(step):
+    """
+    Count a checkout step's result in bari_checkout_outcomes_total, from its response status.
+    Goes under @idempotent, so replayed responses aren't counted twice.
+    """
+    def decorator(handler):
+        if iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def wrapper(*args, **kwargs):
+                try:
+                    response = await handler(*args, **kwargs)
+                except Exception:
+                    record_outcome(step, 'error')
+                    raise
+                record_outcome(step, outcome_for(response.status_code))
+                return response
+        else:
+            @functools.wraps(handler)
+            def wrapper(*args, **kwargs):
+                try:
+                    response = handler(*args, **kwargs)
+                except Exception:
+                    record_outcome(step, 'error')
+                    raise
+                record_outcome(step, outcome_for(response.status_code))
+                return response
+        return wrapper
+    return decorator
+
+
+def exposition():
+    """(body, content type) of a scrape: this process's metrics, or every worker's in multi-process mode."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -5,6 +5,7 @@ Generated by 'django-admin startproject' using Django 5.2.5.
 """
 import os
 from decouple import config
+from corsheaders.defaults import default_headers
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -36,18 +37,29 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bari_project.instrumentation.RequestTimingMiddleware',  # first, so its timings cover everything below
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'bari_app.middleware.WhiteNoiseMiddleware',  # whitenoise's, able to run async under ASGI
+    'bari_app.middleware.APICompressionMiddleware',  # gzip/brotli for API JSON; sees every header set below
     "corsheaders.middleware.CorsMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'bari_app.db_router.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Serve the payment-creation and catalog endpoints from async views (bari_app/async_views.py).
+# asgi.py turns this on; keep it off under WSGI/gunicorn. Every middleware above must stay
+# async-capable, or each request is pinned to a thread again.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
 CORS_ALLOW_ALL_ORIGINS = True 
+# Our custom request headers must be allowed for cross-origin callers, and X-Cart-Token readable by them
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'x-cart-token')
+CORS_EXPOSE_HEADERS = ['X-Cart-Token']
 
 ROOT_URLCONF = 'bari_project.urls'
 
@@ -77,9 +89,32 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST'),
         'PORT': config('DB_PORT', cast=int),
+        # Keep each worker's connection open between requests instead of reconnecting every time,
+        # pinging it first when it is reused so a connection MySQL dropped is replaced transparently.
+        # asgi.py forces 0: under ASGI every request's sync work gets a new thread (and connection).
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=300, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
     }
 }
 
+# Optional read replica for catalog and order-history reads (bari_app/db_router.py)
+if config('DB_REPLICA_HOST', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': config('DB_REPLICA_HOST'),
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT'], cast=int),
+        'USER': config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['bari_app.db_router.ReplicaRouter']
+
+# Seconds a client reads from the primary after one of its own writes (read-your-writes)
+REPLICA_PIN_SECONDS = config('DB_REPLICA_PIN_SECONDS', default=10, cast=int)
+
+# Same as Django's ModelBackend, but fetches the UserProfile with the user (one query per login)
+AUTHENTICATION_BACKENDS = ['bari_app.authentication.ProfileModelBackend']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
@@ -110,18 +145,115 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache
+# LocMem is per-process: with several gunicorn workers point this at a shared backend
+# (FileBasedCache / RedisCache) so catalog version bumps reach every worker.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='bari-foods'),
+    }
+}
+
+# On-the-fly compression of API responses (bari_app/middleware.py): brotli when the client accepts it and
+# the brotli package is installed, else gzip. Bodies under MIN_SIZE bytes go out uncompressed.
+API_COMPRESSION = {
+    'PATH_PREFIXES': ('/api/',),
+    'MIN_SIZE': config('API_COMPRESSION_MIN_SIZE', default=1024, cast=int),
+    'GZIP_LEVEL': config('API_COMPRESSION_GZIP_LEVEL', default=6, cast=int),  # 1-9
+    'BROTLI_QUALITY': config('API_COMPRESSION_BROTLI_QUALITY', default=5, cast=int),  # 0-11
+}
+
+# Seconds a serialized catalog page stays cached (writes invalidate it sooner via the catalog version)
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
+# Seconds stock stays reserved for a Razorpay checkout that hasn't been verified yet
+STOCK_RESERVATION_TTL = config('STOCK_RESERVATION_TTL', default=900, cast=int)
+
+# Seconds a checkout/payment Idempotency-Key keeps replaying its first response
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+# Seconds a key stays locked by a request that never finished (its worker died) before a retry may take
+# it over. Keep it a few times the gunicorn worker timeout (gunicorn.conf.py), so live requests are never
+# run twice.
+IDEMPOTENCY_LEASE = config('IDEMPOTENCY_LEASE', default=120, cast=int)
+
+# Where carts live (bari_app/cart_store.py): 'db' reads and writes CartItem directly; 'cache' keeps
+# {product_id: qty} per user in the cache and writes it back to CartItem behind the request
+# (CART_WRITE_BEHIND) and always before checkout. 'cache' needs a shared cache across workers.
+CART_STORE = config('CART_STORE', default='db')
+CART_CACHE_TIMEOUT = config('CART_CACHE_TIMEOUT', default=7 * 86400, cast=int)
+CART_WRITE_BEHIND = config('CART_WRITE_BEHIND', default=True, cast=bool)
+
+# Seconds a signed-out visitor's cart (and its X-Cart-Token) stays valid
+GUEST_CART_TTL = config('GUEST_CART_TTL', default=7 * 86400, cast=int)
+
+# Seconds a profile read stays cached (saving the User or UserProfile clears it at once)
+PROFILE_CACHE_TTL = config('PROFILE_CACHE_TTL', default=60, cast=int)
+
+# Token buckets for failed password checks at login: burst size / refill period, per client IP
+# and per (username, client IP). Each check costs a full password hash, so these cap the hashing CPU an attacker can burn.
+CREDENTIAL_THROTTLE_RATES = {
+    'ip': config('CREDENTIAL_THROTTLE_IP_RATE', default='20/min'),
+    'username': config('CREDENTIAL_THROTTLE_USERNAME_RATE', default='5/min'),
+}
+
+# Per-request timings (bari_project/instrumentation.py): a Server-Timing header and a log line on the
+# 'bari.requests' logger. Requests over SLOW_REQUEST_MS are logged as warnings with their SLOW_REQUEST_SQL
+# slowest queries.
+REQUEST_INSTRUMENTATION = {
+    'SERVER_TIMING': config('SERVER_TIMING_HEADER', default=True, cast=bool),
+    'SLOW_REQUEST_MS': config('SLOW_REQUEST_MS', default=500, cast=int),
+    'SLOW_REQUEST_SQL': config('SLOW_REQUEST_SQL', default=5, cast=int),
+    # Probes and scrapes only get a log line when they are slow
+    'QUIET_PATHS': ('/healthz', '/readyz', '/metrics'),
+}
+
+# Bearer token a Prometheus scraper must send to /metrics (bari_project/metrics.py); empty turns /metrics off
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# /readyz (bari_project/health.py): seconds each worker reuses its last round of dependency checks,
+# and how long the payment gateway gets to answer a reachability probe
+HEALTH_CHECK_CACHE_SECONDS = config('HEALTH_CHECK_CACHE_SECONDS', default=5, cast=float)
+HEALTH_CHECK_GATEWAY_TIMEOUT = config('HEALTH_CHECK_GATEWAY_TIMEOUT', default=2.0, cast=float)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # INFO logs every request; WARNING keeps only the slow ones
+        'bari.requests': {
+            'handlers': ['console'],
+            'level': config('REQUEST_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework Config
 REST_FRAMEWORK = {
+    # Reverse proxies in front of the app. Client IPs (throttles, login buckets) are read this many hops
+    # back in X-Forwarded-For; 0 uses REMOTE_ADDR and ignores the header, which clients can forge.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+    # DRF's JSON renderer/parser, but through orjson when it is installed (bari_app/renderers.py)
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'bari_app.renderers.FastJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'bari_app.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # simplejwt's JWTAuthentication, minus the User query on read-only requests
+        'bari_app.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        # No BasicAuthentication: it would run a full password hash on every request
     ]
 }
 
@@ -169,4 +301,19 @@ JAZZMIN_UI_TWEAKS = {
 
 # --- RAZORPAY CONFIGURATION ---
 RAZORPAY_KEY_ID = 'rzp_test_RYs6hdXiEGpTRl'
-RAZORPAY_KEY_SECRET = 'q1IJWnMs9ifFF5JSziZLGBl3'
\ No newline at end of file
+RAZORPAY_KEY_SECRET = 'q1IJWnMs9ifFF5JSziZLGBl3'
+
+# Shared, pooled gateway client (bari_app/payments.py). Timeouts in seconds.
+# Point BASE_URL at `manage.py run_fake_gateway` to load-test checkout offline.
+PAYMENT_GATEWAY = {
+    'BASE_URL': config('PAYMENT_GATEWAY_BASE_URL', default='https://api.razorpay.com'),
+    'CONNECT_TIMEOUT': config('PAYMENT_GATEWAY_CONNECT_TIMEOUT', default=3.05, cast=float),
+    'READ_TIMEOUT': config('PAYMENT_GATEWAY_READ_TIMEOUT', default=10.0, cast=float),
+    # Whole call including retries; keep it below the gunicorn worker timeout (gunicorn.conf.py)
+    'DEADLINE': config('PAYMENT_GATEWAY_DEADLINE', default=20.0, cast=float),
+    'POOL_SIZE': config('PAYMENT_GATEWAY_POOL_SIZE', default=10, cast=int),
+    'MAX_RETRIES': config('PAYMENT_GATEWAY_MAX_RETRIES', default=2, cast=int),
+    'BACKOFF': config('PAYMENT_GATEWAY_BACKOFF', default=0.25, cast=float),
+    'BREAKER_THRESHOLD': config('PAYMENT_GATEWAY_BREAKER_THRESHOLD', default=5, cast=int),
+    'BREAKER_COOLDOWN': config('PAYMENT_GATEWAY_BREAKER_COOLDOWN', default=30, cast=int),
+}
@@ -2,13 +2,16 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from .views import home
+from .views import home, metrics, healthz, readyz
 from django.conf.urls.static import static
 
 
 
 urlpatterns = [
     path('', home, name='home'),
+    path('metrics', metrics, name='metrics'),
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
     path('admin/', admin.site.urls),
     path('api/', include('bari_app.urls')),
     
@@ -1,4 +1,29 @@
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+
+from . import health, metrics as bari_metrics
 
 def home(request):
     return HttpResponse("Bari Foods API is running!")
+
+def metrics(request):
+    # Prometheus scrape target, behind "Authorization: Bearer <METRICS_TOKEN>"; off until a token is set
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponse("Not Found", status=404, content_type='text/plain')
+    if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse("Unauthorized", status=401, content_type='text/plain')
+    if bari_metrics.prometheus_client is None:
+        return HttpResponse("prometheus_client is not installed", status=503, content_type='text/plain')
+    body, content_type = bari_metrics.exposition()
+    return HttpResponse(body, content_type=content_type)
+
+def healthz(request):
+    # Liveness: answering at all is the check (see bari_project/health.py)
+    return JsonResponse({'status': 'ok'}, headers={'Cache-Control': 'no-store'})
+
+def readyz(request):
+    report = health.readiness()
+    status = 503 if report['status'] == 'fail' else 200
+    return JsonResponse(report, status=status, headers={'Cache-Control': 'no-store'})
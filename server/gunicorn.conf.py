@@ -0,0 +1,28 @@
+# gunicorn loads this from the working directory (Procfile: gunicorn bari_project.wsgi)
+import glob
+import os
+import tempfile
+
+# Seconds before a silent worker is killed and restarted. Payment gateway calls give up well before
+# this (settings.PAYMENT_GATEWAY['DEADLINE']); raise both together.
+timeout = 30
+
+# Workers are separate processes: prometheus_client keeps each worker's metrics in mmap'd files in
+# this directory and /metrics sums them (bari_project/metrics.py)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'bari-prometheus'))
+
+
+def on_starting(server):
+    # Metrics start from zero with the server: drop the previous run's files
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)